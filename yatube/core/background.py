@@ -0,0 +1,55 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_WORKERS', 2),
+            thread_name_prefix='yatube-background',
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', func)
+    finally:
+        close_old_connections()
+
+
+def after_commit(func, *args, **kwargs):
+    """Вызывает функцию в текущем потоке после коммита транзакции.
+
+    При откате транзакции функция не вызывается. При
+    ``BACKGROUND_TASKS_SYNC = True`` она вызывается сразу, как и в ``submit``.
+    """
+    if getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+        func(*args, **kwargs)
+        return
+    transaction.on_commit(lambda: func(*args, **kwargs))
+
+
+def submit(func, *args, **kwargs):
+    """Выполняет функцию в фоновом пуле после коммита текущей транзакции.
+
+    При ``BACKGROUND_TASKS_SYNC = True`` задача выполняется сразу
+    в текущем потоке — так удобнее в тестах и при отладке.
+    """
+    if getattr(settings, 'BACKGROUND_TASKS_SYNC', False):
+        func(*args, **kwargs)
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, func, args, kwargs)
+    )
@@ -0,0 +1,261 @@
+import itertools
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """Общий для всех процессов кеш в отдельном файле SQLite.
+
+    Воркеры gunicorn открывают один и тот же файл, поэтому видят общие
+    данные и общие счётчики поколений. ``incr`` читает и обновляет
+    значение в одной транзакции под блокировкой записи SQLite, поэтому
+    атомарен между процессами.
+    При превышении ``MAX_ENTRIES`` вытесняются давно не читанные ключи.
+    Чтение само ничего не пишет: время доступа копится в памяти
+    и записывается в транзакции следующей записи этого процесса.
+
+    Дополнительные OPTIONS:
+    ``CULL_EVERY`` — через сколько записей проверять размер кеша,
+    ``BUSY_TIMEOUT`` — сколько секунд ждать блокировку файла.
+    """
+
+    schema = (
+        'CREATE TABLE IF NOT EXISTS cache ('
+        'key TEXT PRIMARY KEY, value BLOB, expires REAL, accessed REAL)',
+        'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    )
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._cull_every = int(options.get('CULL_EVERY', 32))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+        self._writes = itertools.count(1)
+        self._touched = {}
+        self._touched_lock = threading.Lock()
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.schema:
+                db.execute(statement)
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _dump(value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция записи; заодно сохраняет накопленное время доступа."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+            self._flush_touched(db)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _after_write(self):
+        # next() у itertools.count атомарен между потоками.
+        if next(self._writes) % self._cull_every == 0:
+            self._cull()
+
+    def _write(self, sql, params):
+        with self._transaction() as db:
+            cursor = db.execute(sql, params)
+        self._after_write()
+        return cursor.rowcount
+
+    def _cull(self):
+        db = self._db
+        now = time.time()
+        db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (now,),
+        )
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        excess = count - self._max_entries
+        if self._cull_frequency:
+            excess = max(excess, count // self._cull_frequency)
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (excess,),
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        expires = self._expires(timeout)
+        if expires is not None and expires <= now:
+            return False
+        inserted = self._write(
+            'INSERT INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires, accessed = excluded.accessed '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, self._dump(value), expires, now, now),
+        )
+        return bool(inserted)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        now = time.time()
+        placeholders = ','.join('?' * len(made))
+        rows = self._db.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*made, now),
+        ).fetchall()
+        if rows:
+            self._touch_accessed([key for key, _ in rows], now)
+        return {made[key]: self._load(value) for key, value in rows}
+
+    def _touch_accessed(self, keys, now):
+        """Запоминает чтение ключей до ближайшей записи.
+
+        Ключей копится не больше ``MAX_ENTRIES``: остальные чтения
+        до записи на порядок вытеснения не влияют.
+        """
+        with self._touched_lock:
+            for key in keys:
+                if len(self._touched) >= self._max_entries:
+                    break
+                self._touched[key] = now
+
+    def _flush_touched(self, db):
+        """Пишет накопленное время доступа, не чаще раза в секунду на ключ."""
+        with self._touched_lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ? '
+                'AND accessed < ?',
+                [(now, key, now - 1) for key, now in touched.items()],
+            )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        now = time.time()
+        expires = self._expires(timeout)
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append((key, self._dump(value), expires, now))
+        if expires is not None and expires <= now:
+            self.delete_many(data, version=version)
+            return []
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed)'
+                ' VALUES (?, ?, ?, ?)',
+                rows,
+            )
+        self._after_write()
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        now = time.time()
+        return bool(self._write(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, now),
+        ))
+
+    def incr(self, key, delta=1, version=None):
+        made = self.make_key(key, version=version)
+        self.validate_key(made)
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (made, now),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self._load(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (self._dump(value), now, made),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version=version) for key in keys]
+        if not made:
+            return
+        for key in made:
+            self.validate_key(key)
+        placeholders = ','.join('?' * len(made))
+        self._write(f'DELETE FROM cache WHERE key IN ({placeholders})', made)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._write('DELETE FROM cache', ())
+
+    def close(self, **kwargs):
+        # Соединения живут в потоке и переиспользуются между запросами.
+        pass
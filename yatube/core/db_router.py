@@ -0,0 +1,142 @@
+import os
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_state = threading.local()
+
+
+def replicas():
+    """Псевдонимы реплик из ``DATABASE_REPLICAS``.
+
+    Реплика, указывающая на тот же файл, что и основная база (так
+    бывает в тестах с ``TEST['MIRROR']``), не отличается от основной
+    и пропускается: чтение из неё открыло бы лишнее соединение вне
+    транзакции теста.
+    """
+    primary = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+    return [
+        alias for alias in getattr(settings, 'DATABASE_REPLICAS', ())
+        if connections[alias].settings_dict['NAME'] != primary
+    ]
+
+
+def begin_request(pinned):
+    """Начало запроса: ``pinned`` — клиент недавно писал в базу."""
+    _state.pinned = pinned
+    _state.wrote = False
+    _state.replica = None
+    _state.snapshot = ''
+
+
+def _snapshot(alias):
+    """Метка файла реплики: ``sync_sqlite_replica`` подменяет файл
+    целиком, поэтому новый снимок получает новые inode и mtime."""
+    stat = os.stat(connections[alias].settings_dict['NAME'])
+    return f'{alias}:{stat.st_ino}:{stat.st_mtime_ns}'
+
+
+def replica_snapshot():
+    """Снимок реплики, из которой читает текущий блок, или ``''``.
+
+    Кеши, которые заполняются прочитанными данными, добавляют метку
+    в ключ: страница, собранная из отстающей реплики, не попадает
+    под ключ основной базы и не переживает следующий снимок.
+    """
+    return getattr(_state, 'snapshot', '')
+
+
+def end_request():
+    """Конец запроса; возвращает True, если в основную базу писали."""
+    wrote = getattr(_state, 'wrote', False)
+    begin_request(False)
+    return wrote
+
+
+def sync_sqlite_replica(alias):
+    """Копирует основную базу SQLite в файл реплики ``alias``.
+
+    Снимок делается через backup API, так что основная база может
+    работать во время копирования. Готовая копия подменяет файл
+    реплики атомарно: новые соединения сразу видят новый снимок.
+    """
+    primary = connections[DEFAULT_DB_ALIAS].settings_dict
+    replica = connections[alias].settings_dict
+    for settings_dict in (primary, replica):
+        if not settings_dict['ENGINE'].endswith('sqlite3'):
+            raise ValueError(
+                'Копированием обновляются только реплики SQLite.'
+            )
+    target = replica['NAME']
+    temp_path = target + '.part'
+    source = sqlite3.connect(primary['NAME'], uri=True)
+    try:
+        copy = sqlite3.connect(temp_path)
+        try:
+            source.backup(copy)
+        finally:
+            copy.close()
+    finally:
+        source.close()
+    os.replace(temp_path, target)
+
+
+@contextmanager
+def reading_replica():
+    """Чтения внутри блока уходят на случайную реплику.
+
+    Клиент, недавно писавший в базу, продолжает читать из основной,
+    чтобы увидеть свои изменения. Реплика выбирается один раз на блок,
+    так что все запросы страницы видят один и тот же снимок.
+    """
+    previous = (getattr(_state, 'replica', None), replica_snapshot())
+    aliases = replicas()
+    if aliases and not getattr(_state, 'pinned', False):
+        _state.replica = random.choice(aliases)
+        _state.snapshot = _snapshot(_state.replica)
+    try:
+        yield
+    finally:
+        _state.replica, _state.snapshot = previous
+
+
+def replica_reads(view):
+    """Декоратор представления: GET и HEAD читают из реплики."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        with reading_replica():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Чтения из представлений с ``replica_reads`` — в реплики, прочее —
+    в основную базу.
+
+    Первая же запись в запросе возвращает его чтения на основную базу
+    и помечает клиента (см. ``ReplicaPinMiddleware``), чтобы он какое-то
+    время читал свои изменения не из отстающей реплики.
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        _state.replica = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, объекты из них взаимозаменяемы.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит вместе с копией основной базы.
+        return db not in getattr(settings, 'DATABASE_REPLICAS', ())
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from core.template_profile import profiling
+
+COLD_CACHE_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+}
+"""Свой пустой кеш: фрагменты карточек рисуются заново каждый раз."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Запрашивает страницы и показывает, сколько времени уходит '
+        'на каждый шаблон и include. Режим загрузчика шаблонов берётся '
+        'из настроек (TEMPLATES_CACHED).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=['/'],
+            help='Адреса страниц, по умолчанию главная.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=10,
+            help='Сколько раз запросить каждую страницу.',
+        )
+        parser.add_argument(
+            '--user',
+            help='Имя пользователя, от которого делать запросы.',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Не использовать закешированные фрагменты шаблонов.',
+        )
+
+    def handle(self, *args, **options):
+        # Адрес не из INTERNAL_IPS: панель отладки не рисуется.
+        client = Client(REMOTE_ADDR='192.0.2.1')
+        if options['user']:
+            User = get_user_model()
+            try:
+                client.force_login(User.objects.get(username=options['user']))
+            except User.DoesNotExist:
+                raise CommandError(f"Нет пользователя {options['user']}.")
+        for path in options['paths']:
+            profile = self.profile(client, path, options)
+            self.report(path, profile, options['requests'])
+
+    def profile(self, client, path, options):
+        with override_settings(
+            **(COLD_CACHE_SETTINGS if options['cold'] else {})
+        ):
+            with profiling() as profile:
+                for _ in range(options['requests']):
+                    if options['cold']:
+                        cache.clear()
+                    response = client.get(path)
+                    if response.status_code != 200:
+                        raise CommandError(
+                            f'{path} ответил {response.status_code}.'
+                        )
+        return profile
+
+    def report(self, path, profile, requests):
+        self.stdout.write(f'{path}, запросов {requests}, мс на запрос:')
+        for name, stats in profile.rows():
+            self.stdout.write(
+                f"  {name}: вызовов {stats['calls'] / requests:g}, "
+                f"всего {stats['total'] / requests * 1000:.2f}, "
+                f"своё {stats['own'] / requests * 1000:.2f}"
+            )
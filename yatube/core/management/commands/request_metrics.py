@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from core import metrics
+
+
+def _bound(value):
+    return f'>{metrics.BUCKETS_MS[-1]}' if value is None else f'≤{value}'
+
+
+class Command(BaseCommand):
+    help = 'Сводка замеров запросов по именам URL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--histogram',
+            action='store_true',
+            help='Вывести корзины гистограммы времени ответа.',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить замеры после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        # Свои замеры этот процесс мог ещё не выгрузить.
+        metrics.flush()
+        summary = metrics.read()
+        if not summary:
+            self.stdout.write('Замеров пока нет.')
+        for name, stats in summary.items():
+            count = stats['count']
+            if not count:
+                continue
+            self.stdout.write(
+                f'{name}: запросов {count}, '
+                f"среднее {stats['total_us'] / count / 1000:.1f} мс, "
+                f"SQL {stats['queries'] / count:.1f} шт. за "
+                f"{stats['sql_us'] / count / 1000:.1f} мс, "
+                f"шаблоны {stats['template_us'] / count / 1000:.1f} мс, "
+                f'p50 {_bound(metrics.percentile(stats, 0.5))} мс, '
+                f'p99 {_bound(metrics.percentile(stats, 0.99))} мс'
+            )
+            if options['histogram']:
+                bounds = metrics.BUCKETS_MS + (None,)
+                for bound, field in zip(bounds, metrics.bucket_fields()):
+                    self.stdout.write(
+                        f'  {_bound(bound):>7} мс: {stats[field]}'
+                    )
+        if options['reset']:
+            metrics.reset()
+            self.stdout.write(self.style.SUCCESS('Замеры обнулены.'))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db_router import sync_sqlite_replica
+
+
+class Command(BaseCommand):
+    help = 'Обновляет файлы реплик SQLite копией основной базы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'aliases',
+            nargs='*',
+            help='Псевдонимы реплик; по умолчанию все из DATABASE_REPLICAS.',
+        )
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', ())
+        aliases = options['aliases'] or replicas
+        for alias in aliases:
+            if alias not in replicas:
+                raise CommandError(f'{alias} нет в DATABASE_REPLICAS.')
+            try:
+                sync_sqlite_replica(alias)
+            except ValueError as error:
+                raise CommandError(error)
+            self.stdout.write(f'Реплика {alias} обновлена.')
@@ -0,0 +1,168 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+"""Верхние границы корзин гистограммы времени ответа, в мс.
+Последняя корзина без границы собирает всё, что медленнее."""
+
+FIELDS = ('count', 'total_us', 'sql_us', 'template_us', 'queries')
+VIEWS_KEY = 'core:metrics:views'
+"""Число известных представлений; их имена лежат в ``view_key(номер)``."""
+
+_local = threading.local()
+_lock = threading.Lock()
+_buffer = {}
+_last_flush = time.monotonic()
+
+
+class RequestMetrics:
+    """Замеры одного запроса."""
+
+    def __init__(self, keep_queries):
+        self.keep_queries = keep_queries
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.sql = []
+        self.template_depth = 0
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if len(self.sql) < self.keep_queries:
+            self.sql.append((round(duration * 1000, 2), sql))
+
+
+def start(keep_queries):
+    _local.metrics = RequestMetrics(keep_queries)
+    return _local.metrics
+
+
+def stop():
+    _local.metrics = None
+
+
+def current():
+    """Замеры запроса, который обрабатывает текущий поток, или None."""
+    return getattr(_local, 'metrics', None)
+
+
+def field_key(view_name, field):
+    return f'core:metrics:{view_name}:{field}'
+
+
+def view_key(number):
+    return f'{VIEWS_KEY}:{number}'
+
+
+def known_key(view_name):
+    return f'core:metrics:known:{view_name}'
+
+
+def bucket_fields():
+    return [f'le_{bound}' for bound in BUCKETS_MS] + ['le_inf']
+
+
+def add(view_name, total, metrics):
+    """Копит замеры в памяти процесса до следующей выгрузки в кеш."""
+    bucket = bucket_fields()[bisect_left(BUCKETS_MS, total * 1000)]
+    values = {
+        'count': 1,
+        'total_us': int(total * 1e6),
+        'sql_us': int(metrics.sql_time * 1e6),
+        'template_us': int(metrics.template_time * 1e6),
+        'queries': metrics.queries,
+        bucket: 1,
+    }
+    with _lock:
+        stored = _buffer.setdefault(view_name, {})
+        for field, value in values.items():
+            stored[field] = stored.get(field, 0) + value
+
+
+def _incr(key, delta):
+    """Атомарно прибавляет ``delta``; возвращает новое значение."""
+    while True:
+        if cache.add(key, delta, None):
+            return delta
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            # Ключ пропал между add и incr — пробуем снова.
+            continue
+
+
+def _register(view_names):
+    """Дописывает новые представления в список без чтения всего списка.
+
+    Имя занимает ``known_key`` через ``add``, поэтому номер в списке
+    ему выдаёт ровно один процесс, даже если выгружают несколько.
+    """
+    for view_name in view_names:
+        if cache.add(known_key(view_name), True, None):
+            cache.set(view_key(_incr(VIEWS_KEY, 1)), view_name, None)
+
+
+def flush(interval=0):
+    """Прибавляет накопленное к счётчикам в общем кеше.
+
+    Выгрузка идёт не чаще раза в ``interval`` секунд, чтобы запрос
+    не платил записью в кеш за каждую метрику.
+    """
+    global _buffer, _last_flush
+    with _lock:
+        if time.monotonic() - _last_flush < interval or not _buffer:
+            return
+        pending, _buffer = _buffer, {}
+        _last_flush = time.monotonic()
+    for view_name, values in pending.items():
+        for field, value in values.items():
+            _incr(field_key(view_name, field), value)
+    _register(pending)
+
+
+def _view_names():
+    count = cache.get(VIEWS_KEY, 0)
+    names = cache.get_many([view_key(n) for n in range(1, count + 1)])
+    return sorted(set(names.values()))
+
+
+def read():
+    """Сводка по представлениям: суммы и гистограмма времени."""
+    names = _view_names()
+    fields = FIELDS + tuple(bucket_fields())
+    values = cache.get_many([
+        field_key(name, field) for name in names for field in fields
+    ])
+    return {
+        name: {
+            field: values.get(field_key(name, field), 0)
+            for field in fields
+        }
+        for name in names
+    }
+
+
+def percentile(stats, share):
+    """Граница корзины, в которую попадает перцентиль, в мс."""
+    target = stats['count'] * share
+    seen = 0
+    for bound, field in zip(BUCKETS_MS + (None,), bucket_fields()):
+        seen += stats[field]
+        if seen >= target:
+            return bound
+    return None
+
+
+def reset():
+    names = _view_names()
+    fields = FIELDS + tuple(bucket_fields())
+    cache.delete_many(
+        [field_key(name, field) for name in names for field in fields]
+        + [known_key(name) for name in names]
+        + [view_key(n) for n in range(1, cache.get(VIEWS_KEY, 0) + 1)]
+        + [VIEWS_KEY]
+    )
@@ -0,0 +1,114 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import db_router, metrics
+
+slow_logger = logging.getLogger('yatube.slow_requests')
+
+
+class RequestMetricsMiddleware:
+    """Считает запросы к базе, время SQL, шаблонов и ответа целиком.
+
+    Замеры копятся по имени URL (``posts:index``, ``posts:profile``…)
+    и периодически выгружаются в общий кеш; посмотреть их можно
+    командой ``request_metrics``. Медленные запросы вместе со списком
+    SQL пишутся в лог ``yatube.slow_requests``.
+
+    Настройки: ``SLOW_REQUEST_MS`` — порог медленного запроса,
+    ``SLOW_REQUEST_SAMPLE_RATE`` — доля медленных запросов, попадающих
+    в лог, ``REQUEST_METRICS_FLUSH_INTERVAL`` — как часто, в секундах,
+    выгружать замеры в кеш, ``SLOW_REQUEST_QUERIES`` — сколько SQL
+    сохранять для лога.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.sample_rate = getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 1)
+        self.flush_interval = getattr(
+            settings, 'REQUEST_METRICS_FLUSH_INTERVAL', 10
+        )
+        self.keep_queries = getattr(settings, 'SLOW_REQUEST_QUERIES', 50)
+
+    def __call__(self, request):
+        request_metrics = metrics.start(self.keep_queries)
+
+        def record(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                request_metrics.record_query(
+                    sql, time.perf_counter() - started
+                )
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record))
+                response = self.get_response(request)
+        finally:
+            metrics.stop()
+        total = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        metrics.add(view_name, total, request_metrics)
+        metrics.flush(self.flush_interval)
+        if (total * 1000 >= self.slow_ms
+                and random.random() < self.sample_rate):
+            self.log_slow(request, response, view_name, total,
+                          request_metrics)
+        return response
+
+    def log_slow(self, request, response, view_name, total, request_metrics):
+        slow_logger.warning(
+            '%s %s %s [%s] %.1f мс, SQL %d за %.1f мс, шаблоны %.1f мс\n%s',
+            request.method,
+            request.get_full_path(),
+            response.status_code,
+            view_name,
+            total * 1000,
+            request_metrics.queries,
+            request_metrics.sql_time * 1000,
+            request_metrics.template_time * 1000,
+            '\n'.join(
+                f'  {duration} мс: {sql}'
+                for duration, sql in request_metrics.sql
+            ),
+        )
+
+
+class ReplicaPinMiddleware:
+    """Закрепляет за клиентом основную базу после его записи.
+
+    Реплики отстают от основной базы, поэтому клиент, который только
+    что что-то записал, ``REPLICA_PIN_SECONDS`` секунд читает из основной
+    и видит свои изменения. Метка хранится в cookie, а не в сессии:
+    сессия сама лежит в базе и читалась бы из реплики.
+    """
+
+    cookie_name = 'primary_pin'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+    def __call__(self, request):
+        db_router.begin_request(self.cookie_name in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = db_router.end_request()
+        if wrote:
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=self.pin_seconds, httponly=True,
+            )
+        return response
@@ -0,0 +1,109 @@
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """``'10/m'`` → интервал между токенами в миллисекундах."""
+    count, unit = rate.split('/')
+    return UNITS[unit] * 1000 / int(count)
+
+
+def take(key, interval_ms, burst, now_ms=None):
+    """Забирает токен из корзины ``key``; 0 — можно, иначе мс до токена.
+
+    Корзина хранится одним числом — моментом, когда она снова станет
+    полной (алгоритм GCRA), — и обновляется атомарным ``incr``, без
+    чтения перед записью. Отказ возвращает токен обратно. Ключ живёт
+    ``RATE_LIMIT_KEY_TIMEOUT`` секунд: после его истечения корзина
+    считается полной, даже если клиент всё это время упирался в лимит.
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    interval_ms = int(interval_ms)
+    try:
+        full_at = cache.incr(key, interval_ms)
+    except ValueError:
+        full_at = None
+    if full_at is None or full_at - interval_ms < now_ms:
+        # Корзина полна: отсчёт начинается с текущего момента.
+        cache.set(
+            key, now_ms + interval_ms,
+            getattr(settings, 'RATE_LIMIT_KEY_TIMEOUT', 3600),
+        )
+        return 0
+    wait = full_at - now_ms - burst * interval_ms
+    if wait > 0:
+        give_back(key, interval_ms)
+        return wait
+    return 0
+
+
+def give_back(key, interval_ms):
+    """Возвращает токен, взятый ``take``."""
+    try:
+        cache.incr(key, -int(interval_ms))
+    except ValueError:
+        # Ключ успел истечь — корзина и так полна.
+        pass
+
+
+def client_ip(request):
+    # За обратным прокси сюда должен попадать адрес клиента,
+    # а не прокси: это настраивается на самом прокси.
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def rate_limit(scope, methods=None):
+    """Ограничивает частоту запросов к представлению.
+
+    Лимит берётся из ``RATE_LIMITS[scope]``: ``{'rate': '10/m',
+    'burst': 5}``. Проверяются две корзины: по IP-адресу и, для
+    вошедшего пользователя, по его id. IP проверяется первым и без
+    обращения к базе; id пользователя берётся из сессии, а не из
+    ``request.user``, чтобы не загружать пользователя. Отказ — ответ
+    429 с заголовком Retry-After, до представления и его транзакции
+    дело не доходит.
+
+    ``methods`` — какие методы ограничивать, по умолчанию все.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            limit = getattr(settings, 'RATE_LIMITS', {}).get(scope)
+            if limit is None or (
+                    methods is not None and request.method not in methods):
+                return view(request, *args, **kwargs)
+            interval = parse_rate(limit['rate'])
+            burst = limit.get('burst', 1)
+            ip_key = f'ratelimit:{scope}:ip:{client_ip(request)}'
+            wait = take(ip_key, interval, burst)
+            if wait:
+                return too_many_requests(wait)
+            # Сессия читается, только если IP прошёл проверку.
+            user_id = request.session.get(SESSION_KEY)
+            if user_id is not None:
+                wait = take(f'ratelimit:{scope}:user:{user_id}',
+                            interval, burst)
+                if wait:
+                    give_back(ip_key, interval)
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def too_many_requests(wait_ms):
+    response = HttpResponse(
+        'Слишком много запросов, попробуйте позже.',
+        status=429,
+        content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(math.ceil(wait_ms / 1000))
+    return response
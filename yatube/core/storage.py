@@ -0,0 +1,57 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файлы хранятся под SHA-256 своего содержимого.
+
+    ``posts/photo.JPG`` сохраняется как ``posts/ab/abcdef….jpg``:
+    каталог из ``upload_to`` сохраняется, имя заменяется хешем.
+    Одинаковые загрузки попадают в один файл, поэтому удалять файл
+    можно только когда на него не осталось ссылок.
+
+    Содержимое пишется во временный файл, хеш считается по ходу записи,
+    затем файл атомарно переименовывается. Параллельная загрузка того
+    же файла просто перезапишет его тем же содержимым.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым, подбирать свободное не нужно.
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+        digest = hashlib.sha256()
+        handle, temp_path = tempfile.mkstemp(
+            dir=full_directory, suffix='.part'
+        )
+        try:
+            with os.fdopen(handle, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = os.path.join(
+                directory, hexdigest[:2], hexdigest + extension
+            ).replace('\\', '/')
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                return name
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            # mkstemp создаёт файл с правами 0600.
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+            return name
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -0,0 +1,36 @@
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+
+class TimedTemplate(Template):
+    """Шаблон, который прибавляет время отрисовки к замерам запроса."""
+
+    def render(self, context=None, request=None):
+        request_metrics = metrics.current()
+        if request_metrics is None:
+            return super().render(context, request)
+        # render_to_string внутри тега не должен считаться дважды.
+        request_metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            request_metrics.template_depth -= 1
+            if not request_metrics.template_depth:
+                request_metrics.template_time += (
+                    time.perf_counter() - started
+                )
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Обычный движок Django с замером времени отрисовки."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,62 @@
+import time
+from contextlib import contextmanager
+
+from django.template.base import Template
+
+
+class RenderProfile:
+    """Время отрисовки по шаблонам, включая вложенные include.
+
+    ``total`` — время вместе с вложенными шаблонами, ``own`` — без них.
+    Сумма ``own`` по всем шаблонам равна времени отрисовки страниц.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self._stack = []
+
+    def enter(self):
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def exit(self, name):
+        started, children = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        stats = self.stats.setdefault(
+            name, {'calls': 0, 'total': 0.0, 'own': 0.0}
+        )
+        stats['calls'] += 1
+        stats['total'] += elapsed
+        stats['own'] += elapsed - children
+        if self._stack:
+            self._stack[-1][1] += elapsed
+
+    def rows(self):
+        """Строки отчёта, самые дорогие по собственному времени сверху."""
+        return sorted(
+            self.stats.items(), key=lambda item: item[1]['own'], reverse=True
+        )
+
+
+@contextmanager
+def profiling():
+    """Включает замер отрисовки всех шаблонов на время блока.
+
+    Подменяет ``Template._render`` так же, как это делает тестовое
+    окружение Django, поэтому годится только для одного потока:
+    для команд и отладки, не для работающего сервера.
+    """
+    profile = RenderProfile()
+    original = Template._render
+
+    def _render(template, context):
+        profile.enter()
+        try:
+            return original(template, context)
+        finally:
+            profile.exit(template.origin.template_name or '<string>')
+
+    Template._render = _render
+    try:
+        yield profile
+    finally:
+        Template._render = original
@@ -0,0 +1,39 @@
+from django import template
+
+register = template.Library()
+
+
+class InlineNode(template.Node):
+    """Вложенный шаблон, который хранится в узле родительского."""
+
+    def __init__(self, template_name):
+        self.template_name = template_name
+        self.included = None
+
+    def render(self, context):
+        if self.included is None:
+            self.included = context.template.engine.get_template(
+                self.template_name
+            )
+        # Как у include без параметров: общий контекст, свой render_context.
+        with context.render_context.push_state(self.included):
+            return self.included._render(context)
+
+
+@register.tag
+def inline(parser, token):
+    """``{% inline 'posts/includes/posts_card.html' %}``.
+
+    То же, что ``{% include %}`` с именем-строкой, но шаблон ищется
+    и компилируется при первой отрисовке и дальше живёт вместе
+    с родительским, а не ищется по имени на каждой итерации цикла.
+    С кешируемым загрузчиком это происходит раз на процесс.
+    Переменные и ``with`` не поддерживаются.
+    """
+    bits = token.split_contents()
+    name = bits[1] if len(bits) == 2 else ''
+    if len(name) < 2 or name[0] not in '\'"' or name[0] != name[-1]:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} принимает одно имя шаблона в кавычках.'
+        )
+    return InlineNode(name[1:-1])
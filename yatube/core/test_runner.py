@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Прогон тестов с кешем во временном файле.
+
+    Тесты вызывают ``cache.clear()``, а общий файл кеша из настроек
+    принадлежит работающему сайту. Бэкенд остаётся тем же, меняется
+    только расположение файла.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp()
+        caches = {
+            alias: dict(
+                config,
+                LOCATION=os.path.join(self._cache_dir, f'{alias}.sqlite3'),
+            )
+            for alias, config in settings.CACHES.items()
+        }
+        self._cache_override = override_settings(CACHES=caches)
+        self._cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_override.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+
+from ..cache import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    """Тесты общего файлового кеша."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Другой процесс видит записанные значения."""
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.make_cache().get('key'), {'value': [1, 2]})
+
+    def test_add_and_expiry(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.cache.get('key'), 'first')
+        self.cache.set('expired', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('expired'))
+
+    def test_incr_is_atomic(self):
+        """Параллельные инкременты не теряются."""
+        self.cache.set('counter', 0)
+
+        def worker():
+            cache = self.make_cache()
+            for _ in range(50):
+                cache.incr('counter')
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читанные ключи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_EVERY=1)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        cache._db.execute("UPDATE cache SET accessed = 0 WHERE key LIKE '%b'")
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get_many(['a', 'c', 'd']), {
+            'a': 'a', 'c': 'c', 'd': 'd',
+        })
+
+    def test_reads_do_not_write(self):
+        """Время доступа пишется со следующей записью, а не при чтении."""
+        self.cache.set('key', 'value')
+        self.cache._db.execute('UPDATE cache SET accessed = 0')
+        changes = self.cache._db.total_changes
+
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache._db.total_changes, changes)
+
+        self.cache.set('other', 'value')
+        accessed = self.cache._db.execute(
+            "SELECT accessed FROM cache WHERE key LIKE '%key'"
+        ).fetchone()[0]
+        self.assertGreater(accessed, 0)
@@ -0,0 +1,120 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.db import connections
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import reverse
+
+from posts.caching import FEED_SCOPE, attach_card_versions
+from posts.conditional import page_etag
+from posts.models import Post, User
+from .. import db_router
+from ..middleware import ReplicaPinMiddleware
+
+
+class ReplicaRouterTests(TestCase):
+    """Тесты маршрутизации чтений по репликам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        db_router.begin_request(False)
+        self.addCleanup(db_router.end_request)
+
+    def test_mirror_is_not_a_replica(self):
+        """Зеркало основной базы в тестах не считается репликой."""
+        self.assertEqual(db_router.replicas(), [])
+
+    @mock.patch('core.db_router._snapshot', return_value='replica:1:1')
+    @mock.patch('core.db_router.replicas', return_value=['replica'])
+    def test_reads_go_to_replica_until_write(self, replicas, snapshot):
+        """Чтения уходят в реплику, после записи — в основную базу."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        with db_router.reading_replica():
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertTrue(db_router.end_request())
+
+    @mock.patch('core.db_router.replicas', return_value=['replica'])
+    def test_pinned_client_reads_primary(self, replicas):
+        """Недавно писавший клиент читает из основной базы."""
+        db_router.begin_request(True)
+        with db_router.reading_replica():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    @mock.patch('core.db_router._snapshot', return_value='replica:1:1')
+    @mock.patch('core.db_router.replicas', return_value=['replica'])
+    def test_replica_pages_are_keyed_on_snapshot(self, replicas, snapshot):
+        """ETag и версии карточек из реплики не совпадают с основными."""
+        request = RequestFactory().get('/')
+        request.user = self.author
+        primary_etag = page_etag(request, [FEED_SCOPE])
+        primary_card = attach_card_versions([self.post])[0].card_version
+        with db_router.reading_replica():
+            self.assertEqual(db_router.replica_snapshot(), 'replica:1:1')
+            replica_etag = page_etag(request, [FEED_SCOPE])
+            replica_card = attach_card_versions([self.post])[0].card_version
+        self.assertNotEqual(primary_etag, replica_etag)
+        self.assertNotEqual(primary_card, replica_card)
+        self.assertEqual(db_router.replica_snapshot(), '')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_replicas_are_not_migrated(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+
+    def test_write_pins_client(self):
+        """После записи клиент получает метку основной базы."""
+        client = Client()
+        client.force_login(self.author)
+        cookie = ReplicaPinMiddleware.cookie_name
+        response = client.get(reverse('posts:index'))
+        self.assertNotIn(cookie, response.cookies)
+        response = client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            data={'text': 'Комментарий'},
+        )
+        self.assertIn(cookie, response.cookies)
+
+
+class SyncReplicaTests(SimpleTestCase):
+    """Тесты копирования базы SQLite в реплику."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_sync_copies_primary(self):
+        """Реплика получает снимок основной базы и заменяет старый."""
+        primary = os.path.join(self.directory, 'db.sqlite3')
+        replica = os.path.join(self.directory, 'replica.sqlite3')
+        source = sqlite3.connect(primary)
+        source.execute('CREATE TABLE item (value INTEGER)')
+        source.execute('INSERT INTO item VALUES (1)')
+        source.commit()
+        with mock.patch.dict(connections['default'].settings_dict,
+                             NAME=primary), \
+                mock.patch.dict(connections['replica'].settings_dict,
+                                NAME=replica):
+            db_router.sync_sqlite_replica('replica')
+            source.execute('INSERT INTO item VALUES (2)')
+            source.commit()
+            db_router.sync_sqlite_replica('replica')
+        source.close()
+        copy = sqlite3.connect(replica)
+        try:
+            values = [row[0] for row in copy.execute('SELECT value FROM item')]
+        finally:
+            copy.close()
+        self.assertEqual(values, [1, 2])
+        self.assertFalse(os.path.exists(replica + '.part'))
@@ -0,0 +1,78 @@
+import threading
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics
+
+User = get_user_model()
+
+
+@override_settings(REQUEST_METRICS_FLUSH_INTERVAL=0, SLOW_REQUEST_MS=0)
+class RequestMetricsTests(TestCase):
+    """Замеры запросов по именам URL."""
+
+    def setUp(self):
+        cache.clear()
+        metrics.flush()
+        metrics.reset()
+
+    def test_metrics_are_aggregated_by_url_name(self):
+        """Запросы, SQL и шаблоны копятся под именем представления."""
+        with self.assertLogs('yatube.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+            self.client.get(reverse('posts:index'))
+
+        stats = metrics.read()['posts:index']
+        self.assertEqual(stats['count'], 2)
+        self.assertGreater(stats['queries'], 0)
+        self.assertGreater(stats['template_us'], 0)
+        self.assertGreaterEqual(stats['total_us'], stats['template_us'])
+        self.assertEqual(
+            sum(stats[field] for field in metrics.bucket_fields()), 2
+        )
+        self.assertIn('[posts:index]', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_request_metrics_command(self):
+        """Команда выводит сводку и обнуляет её по --reset."""
+        with self.assertLogs('yatube.slow_requests', 'WARNING'):
+            self.client.get(reverse('about:author'))
+        out = StringIO()
+        call_command('request_metrics', histogram=True, reset=True, stdout=out)
+        self.assertIn('about:author: запросов 1', out.getvalue())
+        self.assertIn('Замеры обнулены.', out.getvalue())
+        self.assertEqual(metrics.read(), {})
+
+    def test_concurrent_flushes_keep_every_view(self):
+        """Одновременные выгрузки не теряют ни представлений, ни сумм."""
+        def flush_as_process(number):
+            # Как выгрузка отдельного процесса со своим буфером.
+            for name in (f'view_{number}', 'shared'):
+                metrics._incr(metrics.field_key(name, 'count'), 1)
+            metrics._register([f'view_{number}', 'shared'])
+
+        threads = [
+            threading.Thread(target=flush_as_process, args=(number,))
+            for number in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = metrics.read()
+        self.assertEqual(
+            sorted(stats), sorted(['shared'] + [f'view_{n}' for n in range(8)])
+        )
+        self.assertEqual(stats['shared']['count'], 8)
+
+    def test_percentile_uses_bucket_bounds(self):
+        stats = dict.fromkeys(metrics.bucket_fields(), 0)
+        stats.update(count=100, le_10=90, le_inf=10)
+        self.assertEqual(metrics.percentile(stats, 0.5), 10)
+        self.assertIsNone(metrics.percentile(stats, 0.99))
@@ -0,0 +1,81 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post
+from ..ratelimit import parse_rate, take
+
+User = get_user_model()
+
+
+class TokenBucketTests(TestCase):
+    """Корзина токенов на атомарных счётчиках кеша."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('10/m'), 6000)
+        self.assertEqual(parse_rate('2/s'), 500)
+
+    def test_burst_then_refill(self):
+        """Сначала весь объём корзины, дальше по токену за интервал."""
+        self.assertEqual(take('bucket', 1000, 2, now_ms=0), 0)
+        self.assertEqual(take('bucket', 1000, 2, now_ms=0), 0)
+        self.assertEqual(take('bucket', 1000, 2, now_ms=0), 1000)
+        self.assertEqual(take('bucket', 1000, 2, now_ms=500), 500)
+        self.assertEqual(take('bucket', 1000, 2, now_ms=1000), 0)
+        self.assertEqual(take('bucket', 1000, 2, now_ms=1000), 1000)
+        # За время простоя корзина наполняется, но не сверх объёма.
+        self.assertEqual(take('bucket', 1000, 2, now_ms=60000), 0)
+        self.assertEqual(take('bucket', 1000, 2, now_ms=60000), 0)
+        self.assertEqual(take('bucket', 1000, 2, now_ms=60000), 1000)
+
+
+@override_settings(RATE_LIMITS={'comment': {'rate': '1/m', 'burst': 2}})
+class RateLimitViewTests(TestCase):
+    """Ограничение записи в представлениях."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='bot')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:add_comment', args=(self.post.id,))
+
+    def comment(self, client):
+        return client.post(self.url, data={'text': 'Спам'})
+
+    def test_ip_limit_rejects_without_queries(self):
+        """Лишний запрос с того же IP получает 429 без запросов к базе."""
+        client = Client()
+        client.force_login(self.user)
+        for _ in range(2):
+            self.assertEqual(
+                self.comment(client).status_code, HTTPStatus.FOUND
+            )
+        with self.assertNumQueries(0):
+            response = self.comment(client)
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_user_limit_follows_user_across_ips(self):
+        """Смена адреса не обходит лимит пользователя."""
+        for number in range(3):
+            client = Client(REMOTE_ADDR=f'192.0.2.{number}')
+            client.force_login(self.user)
+            response = self.comment(client)
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_get_is_not_limited(self):
+        for _ in range(3):
+            self.assertEqual(
+                self.client.get(self.url).status_code, HTTPStatus.FOUND
+            )
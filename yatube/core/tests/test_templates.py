@@ -0,0 +1,78 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.template import Context, Engine, TemplateSyntaxError
+from django.test import TestCase
+
+from posts.contstants import VARIABLE_POSTS
+from posts.models import Post
+from ..template_profile import profiling
+
+User = get_user_model()
+
+
+class InlineTagTests(TestCase):
+    """Тег inline ведёт себя как include со строкой."""
+
+    def setUp(self):
+        self.engine = Engine(
+            loaders=[('django.template.loaders.locmem.Loader', {
+                'item.html': '{{ item }}{% if not forloop.last %},{% endif %}',
+            })],
+            libraries={'inline': 'core.templatetags.inline'},
+        )
+
+    def render(self, source, **context):
+        return self.engine.from_string(source).render(Context(context))
+
+    def test_inline_matches_include(self):
+        loop = '{% load inline %}{% for item in items %}{% TAG %}{% endfor %}'
+        items = [1, 2, 3]
+        self.assertEqual(
+            self.render(loop.replace('TAG', "inline 'item.html'"),
+                        items=items),
+            self.render(loop.replace('TAG', "include 'item.html'"),
+                        items=items),
+        )
+        self.assertEqual(
+            self.render(loop.replace('TAG', "inline 'item.html'"),
+                        items=items),
+            '1,2,3',
+        )
+
+    def test_inline_needs_literal_name(self):
+        with self.assertRaises(TemplateSyntaxError):
+            self.render('{% load inline %}{% inline name %}', name='item.html')
+
+
+class RenderProfileTests(TestCase):
+    """Профилировщик делит время отрисовки по шаблонам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='profiled')
+        for i in range(VARIABLE_POSTS):
+            Post.objects.create(author=cls.author, text=f'Пост {i}')
+
+    def test_card_loop_is_attributed(self):
+        with profiling() as profile:
+            self.client.get('/')
+        stats = dict(profile.rows())
+        card = stats['posts/includes/posts_card.html']
+        page = stats['posts/index.html']
+        self.assertEqual(card['calls'], VARIABLE_POSTS)
+        self.assertLessEqual(card['total'], page['total'])
+        self.assertAlmostEqual(
+            sum(row['own'] for row in stats.values()), page['total'],
+            delta=page['total'] * 0.01,
+        )
+
+    def test_profile_templates_command(self):
+        out = StringIO()
+        call_command(
+            'profile_templates', '/', requests=2, cold=True, stdout=out
+        )
+        self.assertIn(
+            'posts/includes/posts_card.html: вызовов 10,', out.getvalue()
+        )
@@ -0,0 +1,138 @@
+from django.http import JsonResponse
+
+from core.db_router import replica_reads
+from . import timeline
+from .caching import FEED_SCOPE, group_scope
+from .conditional import (
+    author_for, conditional_page, group_for, group_scopes, index_scopes,
+    profile_scopes,
+)
+from .contstants import FEED_API_FIELDS
+from .counts import cached_count, estimated_count
+from .models import Post, UserStats
+from .utils import imitation_of_page
+
+KEY_FIELDS = ('id', 'pub_date')
+"""Без них не построить курсор и не разложить посты ленты подписок."""
+
+
+def requested_fields(request):
+    """Поля из ``?fields=id,text``; без параметра — все.
+
+    Неизвестное поле — ValueError.
+    """
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(FEED_API_FIELDS)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in FEED_API_FIELDS]
+    if unknown or not fields:
+        raise ValueError(
+            'Неизвестные поля: {}. Доступны: {}.'.format(
+                ', '.join(unknown) or '—', ', '.join(FEED_API_FIELDS)
+            )
+        )
+    return fields
+
+
+def project(queryset, fields):
+    """Queryset словарей только с колонками запрошенных полей.
+
+    Автор и группа приходят тем же запросом через JOIN, модели
+    не создаются.
+    """
+    lookups = {FEED_API_FIELDS[name] for name in fields}
+    return queryset.values(*lookups.union(KEY_FIELDS))
+
+
+def serialize(rows, fields):
+    """Строки ``values()`` в словари API с публичными именами полей."""
+    storage = Post._meta.get_field('image').storage
+    lookups = [(name, FEED_API_FIELDS[name]) for name in fields]
+    items = []
+    for row in rows:
+        item = {name: row[lookup] for name, lookup in lookups}
+        if item.get('image'):
+            item['image'] = storage.url(item['image'])
+        elif 'image' in item:
+            item['image'] = None
+        items.append(item)
+    return items
+
+
+def page_response(page_obj, rows, fields):
+    return JsonResponse({
+        'results': serialize(rows, fields),
+        'count': page_obj.count,
+        'next': page_obj.next_cursor,
+        'previous': page_obj.previous_cursor,
+    })
+
+
+def feed_response(request, queryset, count=None):
+    """JSON-страница ленты с курсорами, как у HTML-версии."""
+    try:
+        fields = requested_fields(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    page_obj = imitation_of_page(request, project(queryset, fields),
+                                 count=count)
+    return page_response(page_obj, page_obj.object_list, fields)
+
+
+@replica_reads
+@conditional_page(index_scopes)
+def index(request):
+    """Главная лента в JSON."""
+    return feed_response(
+        request, Post.objects.all(),
+        count=lambda: estimated_count(Post.objects.all(), FEED_SCOPE),
+    )
+
+
+@replica_reads
+@conditional_page(group_scopes)
+def group_posts(request, slug):
+    """Лента группы в JSON."""
+    group = group_for(request, slug)
+    return feed_response(
+        request, group.posts.all(),
+        count=lambda: cached_count(group.posts.all(), group_scope(group.id)),
+    )
+
+
+@replica_reads
+@conditional_page(profile_scopes)
+def profile(request, username):
+    """Посты автора в JSON."""
+    author = author_for(request, username)
+    return feed_response(
+        request, author.posts.all(),
+        count=UserStats.for_user(author).posts_count,
+    )
+
+
+def follow_index(request):
+    """Лента подписок в JSON.
+
+    Страница выбирается по записям ленты, посты приходят одним
+    запросом по их id. Анонимный клиент получает ошибку в JSON,
+    а не перенаправление на страницу входа.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse(
+            {'error': 'Лента подписок доступна после входа.'}, status=403
+        )
+    try:
+        fields = requested_fields(request)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    page_obj = timeline.entries_page(request, request.user)
+    ids = [row['post_id'] for row in page_obj.object_list]
+    rows = {
+        row['id']: row
+        for row in project(Post.objects.filter(id__in=ids), fields)
+    }
+    return page_response(
+        page_obj, [rows[pk] for pk in ids if pk in rows], fields
+    )
@@ -0,0 +1,218 @@
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import counters, search, timeline
+from .contstants import BENCHMARK_BATCH_SIZE
+from .models import Comment, Follow, Group, Post, User
+
+
+def _zipf_weights(size, skew):
+    """Веса Ципфа: немногие элементы получают большую часть выборки."""
+    return [1 / rank ** skew for rank in range(1, size + 1)]
+
+
+def generate(posts, users, groups=5, follow_density=0.01,
+             comments_per_post=2, comment_skew=1.2, seed=0):
+    """Наполняет пустую базу синтетическими данными.
+
+    ``follow_density`` — доля авторов, на которых подписан каждый
+    пользователь; ``comment_skew`` — показатель распределения Ципфа:
+    чем он больше, тем сильнее комментарии сосредоточены на немногих
+    постах. Возвращает самые «тяжёлые» объекты для замеров.
+    """
+    rng = random.Random(seed)
+    password = make_password(None)
+    User.objects.bulk_create(
+        [
+            User(username=f'bench{number}', password=password)
+            for number in range(users)
+        ]
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith='bench')
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    Group.objects.bulk_create(
+        [
+            Group(title=f'Группа {number}', slug=f'bench-{number}',
+                  description='Группа для нагрузочного теста')
+            for number in range(groups)
+        ]
+    )
+    group_ids = list(
+        Group.objects.filter(slug__startswith='bench-')
+        .values_list('pk', flat=True)
+    ) + [None]
+
+    # Авторство тоже неравномерно: есть плодовитые авторы.
+    author_weights = _zipf_weights(len(user_ids), 1.0)
+    now = timezone.now()
+    generated = [
+        Post(
+            author_id=author_id,
+            group_id=rng.choice(group_ids),
+            text=f'Пост номер {number} ' * 5,
+        )
+        for number, author_id in enumerate(
+            rng.choices(user_ids, author_weights, k=posts)
+        )
+    ]
+    Post.objects.bulk_create(generated)
+    # auto_now_add ставит всем постам одно время вставки: разброс
+    # дат возвращается отдельным UPDATE. SQLite не отдаёт id из
+    # bulk_create, а вставка идёт по порядку списка.
+    new_ids = list(
+        Post.objects.order_by('-pk').values_list('pk', flat=True)[:posts]
+    )
+    for number, (post, pk) in enumerate(zip(generated, new_ids[::-1])):
+        post.pk = pk
+        post.pub_date = now - timedelta(minutes=number)
+    Post.objects.bulk_update(
+        generated, ['pub_date'], batch_size=BENCHMARK_BATCH_SIZE
+    )
+    post_ids = list(
+        Post.objects.order_by('-pub_date').values_list('pk', flat=True)
+    )
+    rng.shuffle(post_ids)
+
+    follows = set()
+    per_user = max(1, int(len(user_ids) * follow_density))
+    for user_id in user_ids:
+        for author_id in rng.choices(user_ids, author_weights, k=per_user):
+            if author_id != user_id:
+                follows.add((user_id, author_id))
+    Follow.objects.bulk_create(
+        [Follow(user_id=user, author_id=author) for user, author in follows]
+    )
+
+    commented = rng.choices(
+        post_ids,
+        _zipf_weights(len(post_ids), comment_skew),
+        k=posts * comments_per_post,
+    )
+    Comment.objects.bulk_create(
+        [
+            Comment(
+                post_id=post_id,
+                author_id=rng.choice(user_ids),
+                text='Комментарий',
+            )
+            for post_id in commented
+        ]
+    )
+
+    counters.reconcile_posts(BENCHMARK_BATCH_SIZE)
+    counters.reconcile_users(BENCHMARK_BATCH_SIZE)
+    timeline.rebuild_timelines(BENCHMARK_BATCH_SIZE)
+    search.rebuild_index(BENCHMARK_BATCH_SIZE)
+    return {
+        'author': User.objects.order_by('-stats__posts_count').first(),
+        'reader': User.objects.order_by('-stats__following_count').first(),
+        'group': Group.objects.order_by('pk').first(),
+        'post': Post.objects.order_by('-comments_count').first(),
+    }
+
+
+def scenarios(objects):
+    """Имя сценария, адрес и пользователь, от имени которого запрос."""
+    return (
+        ('index', reverse('posts:index'), None),
+        ('group_posts', reverse(
+            'posts:group_list', args=[objects['group'].slug]
+        ), None),
+        ('profile', reverse(
+            'posts:profile', args=[objects['author'].username]
+        ), None),
+        ('post_detail', reverse(
+            'posts:post_detail', args=[objects['post'].pk]
+        ), None),
+        ('follow_index', reverse('posts:follow_index'), objects['reader']),
+    )
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    index = max(0, round(share * len(ordered) + 0.5) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def measure(url, user=None, requests=50, warm=False):
+    """Замеряет один адрес.
+
+    Без ``warm`` кеш очищается перед каждым запросом, и замеряется
+    путь до базы. Память снимается отдельным проходом, потому что
+    tracemalloc сам замедляет выполнение.
+    """
+    client = Client()
+    if user is not None:
+        client.force_login(user)
+
+    def request():
+        if not warm:
+            cache.clear()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: ответ {response.status_code}')
+
+    request()
+    with CaptureQueriesContext(connection) as queries:
+        request()
+    # Следующие запросы очищают журнал соединения.
+    query_count = len(queries)
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        request()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        request()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'queries': query_count,
+        'p50_ms': round(percentile(timings, 0.5), 2),
+        'p99_ms': round(percentile(timings, 0.99), 2),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Список регрессий относительно сохранённых замеров.
+
+    Рост числа запросов считается регрессией всегда, время и память —
+    если выросли больше чем на долю ``tolerance``.
+    """
+    regressions = []
+    for size, views in results.items():
+        for view, current in views.items():
+            previous = baseline.get(size, {}).get(view)
+            if previous is None:
+                continue
+            if current['queries'] > previous['queries']:
+                regressions.append(
+                    f"{size} {view}: запросов {previous['queries']} → "
+                    f"{current['queries']}"
+                )
+            for metric in ('p50_ms', 'p99_ms', 'peak_kb'):
+                if current[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(
+                        f'{size} {view}: {metric} {previous[metric]} → '
+                        f'{current[metric]}'
+                    )
+    return regressions
@@ -0,0 +1,204 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+
+from core.db_router import replica_snapshot
+
+from .contstants import FEED_CACHE_TIMEOUT, FEED_STATS_FLUSH_EVERY
+from .utils import imitation_of_page
+
+FEED_SCOPE = 'feed'
+RANKING_SCOPE = 'ranking'
+RECOMMENDATIONS_SCOPE = 'recommendations'
+THUMBNAILS_SCOPE = 'thumbnails'
+STATS_KEYS = {
+    'hits': 'posts:stats:hits',
+    'misses': 'posts:stats:misses',
+    'invalidations': 'posts:stats:invalidations',
+}
+
+_local_stats = dict.fromkeys(STATS_KEYS, 0)
+_local_stats_lock = threading.Lock()
+
+
+def _incr(key, delta=1):
+    """Атомарно увеличивает счётчик в кеше, создавая его при отсутствии."""
+    if cache.add(key, delta, None):
+        return delta
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+        return delta
+
+
+def _count(name, delta=1):
+    """Событие статистики кеша.
+
+    События копятся в процессе и уходят в общий кеш пачкой раз
+    в FEED_STATS_FLUSH_EVERY событий, иначе каждый просмотр ленты
+    был бы записью в кеш. Недописанный остаток теряется с процессом.
+    """
+    with _local_stats_lock:
+        _local_stats[name] += delta
+        if sum(_local_stats.values()) < FEED_STATS_FLUSH_EVERY:
+            return
+        pending = dict(_local_stats)
+        _local_stats.update(dict.fromkeys(_local_stats, 0))
+    for name, value in pending.items():
+        if value:
+            _incr(STATS_KEYS[name], value)
+
+
+def post_version_key(post_id):
+    return f'posts:post_version:{post_id}'
+
+
+def generation_key(scope):
+    return f'posts:generation:{scope}'
+
+
+def modified_key(scope):
+    return f'posts:modified:{scope}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def bump_post_version(post_id):
+    """Инвалидирует закешированную карточку поста."""
+    _incr(post_version_key(post_id))
+
+
+def _seed():
+    """Начальное значение поколения, которого ещё не было.
+
+    Ключ поколения может быть вытеснен из кеша; если начать отсчёт
+    заново с нуля, старые страницы и ETag снова станут «свежими».
+    Отсчёт от текущего времени в микросекундах этого не допускает.
+    """
+    return int(time.time() * 1e6)
+
+
+def generations(scopes):
+    """Текущие поколения лент; пропавшие из кеша заводятся заново."""
+    keys = {generation_key(scope): scope for scope in scopes}
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    for key in missing:
+        cache.add(key, _seed(), None)
+    if missing:
+        values.update(cache.get_many(missing))
+    return {keys[key]: value for key, value in values.items()}
+
+
+def bump_generations(*scopes):
+    """Сдвигает поколения лент, после чего их кеш считается устаревшим."""
+    for scope in scopes:
+        key = generation_key(scope)
+        if not cache.add(key, _seed(), None):
+            _incr(key)
+    cache.set_many(
+        {modified_key(scope): time.time() for scope in scopes}, None
+    )
+    _count('invalidations', len(scopes))
+
+
+def last_modified(scopes):
+    """Время последнего изменения лент или None, если оно неизвестно."""
+    values = cache.get_many([modified_key(scope) for scope in scopes])
+    if not values:
+        return None
+    return datetime.fromtimestamp(max(values.values()), timezone.utc)
+
+
+def post_scopes(post, group_ids=()):
+    """Ленты, в которых выводится пост, и страница самого поста."""
+    scopes = {
+        FEED_SCOPE, author_scope(post.author_id), post_scope(post.id),
+    }
+    for group_id in {post.group_id, *group_ids}:
+        if group_id is not None:
+            scopes.add(group_scope(group_id))
+    return scopes
+
+
+def invalidate_post(post, group_ids=()):
+    """Сбрасывает карточку поста и все ленты, где он выводится."""
+    bump_post_version(post.id)
+    bump_generations(*post_scopes(post, group_ids))
+
+
+def attach_card_versions(page_obj):
+    """Проставляет постам страницы версии для ключей кеша карточек.
+
+    Версии всех постов страницы читаются одним обращением к кешу.
+    Карточки, нарисованные по реплике, кешируются отдельно от карточек
+    основной базы: к версии добавляется метка снимка.
+    """
+    keys = {post_version_key(post.id): post for post in page_obj}
+    versions = cache.get_many(keys)
+    snapshot = replica_snapshot()
+    for key, post in keys.items():
+        post.card_version = versions.get(key, 0)
+        if snapshot:
+            post.card_version = f'{post.card_version}@{snapshot}'
+    return page_obj
+
+
+def cached_feed_page(request, queryset, *scopes, count=None):
+    """Страница ленты из кеша, привязанного к поколениям ``scopes``.
+
+    Ключ включает текущие поколения лент, поэтому любое изменение
+    поста, комментария или подписки делает старую запись недостижимой,
+    и TTL можно держать длинным. Страницы из реплики хранятся
+    под меткой её снимка.
+    """
+    current = generations(scopes)
+    position = '{}:{}'.format(
+        request.GET.get('cursor', ''), request.GET.get('page', '')
+    )
+    key = 'posts:page:{}:{}:{}:{}'.format(
+        ','.join(scopes),
+        ','.join(str(current[scope]) for scope in scopes),
+        replica_snapshot(),
+        hashlib.md5(position.encode()).hexdigest(),
+    )
+    page_obj = cache.get(key)
+    if page_obj is None:
+        _count('misses')
+        page_obj = imitation_of_page(request, queryset, count=count)
+        page_obj.object_list = list(page_obj.object_list)
+        cache.set(key, page_obj, FEED_CACHE_TIMEOUT)
+    else:
+        _count('hits')
+    return attach_card_versions(page_obj)
+
+
+def get_stats():
+    """Счётчики из кеша вместе с ещё не записанными событиями процесса."""
+    values = cache.get_many(STATS_KEYS.values())
+    with _local_stats_lock:
+        local = dict(_local_stats)
+    return {
+        name: values.get(key, 0) + local[name]
+        for name, key in STATS_KEYS.items()
+    }
+
+
+def reset_stats():
+    with _local_stats_lock:
+        _local_stats.update(dict.fromkeys(_local_stats, 0))
+    cache.delete_many(STATS_KEYS.values())
@@ -0,0 +1,106 @@
+import hashlib
+
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition
+
+from core.db_router import replica_snapshot
+from .caching import (
+    FEED_SCOPE, RANKING_SCOPE, RECOMMENDATIONS_SCOPE, author_scope,
+    generations, group_scope, last_modified, post_scope,
+)
+from .models import Group, Post, User
+
+
+def _memo(request, name, factory):
+    """Один объект на запрос: его ищут и валидаторы, и представление."""
+    objects = request.__dict__.setdefault('_posts_objects', {})
+    if name not in objects:
+        objects[name] = factory()
+    return objects[name]
+
+
+def group_for(request, slug):
+    return _memo(
+        request, ('group', slug),
+        lambda: get_object_or_404(Group, slug=slug),
+    )
+
+
+def author_for(request, username):
+    return _memo(
+        request, ('author', username),
+        lambda: get_object_or_404(User, username=username),
+    )
+
+
+def post_for(request, post_id):
+    return _memo(
+        request, ('post', post_id),
+        lambda: get_object_or_404(
+            Post.objects.select_related('author', 'group'), pk=post_id
+        ),
+    )
+
+
+def page_etag(request, scopes):
+    """Слабый ETag страницы: поколения лент, адрес и пользователь.
+
+    Страница выглядит по-разному для разных пользователей (шапка,
+    кнопка подписки), поэтому пользователь входит в тег. Страница
+    из реплики получает тег её снимка: после синхронизации реплики
+    старый тег перестаёт совпадать.
+    """
+    current = generations(scopes)
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    raw = '{}:{}:{}:{}'.format(
+        user,
+        request.get_full_path(),
+        replica_snapshot(),
+        ','.join(f'{scope}={current[scope]}' for scope in sorted(scopes)),
+    )
+    return 'W/"{}"'.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def conditional_page(scopes):
+    """Отвечает 304 на неизменившуюся страницу, не строя её.
+
+    ``scopes(request, *args, **kwargs)`` возвращает ленты, от которых
+    зависит страница. Проверка стоит нескольких чтений из кеша
+    и не выполняет ни запрос ленты, ни шаблон.
+    """
+    def etag(request, *args, **kwargs):
+        return page_etag(request, scopes(request, *args, **kwargs))
+
+    def modified(request, *args, **kwargs):
+        # Время изменения знает только основная база: реплика могла
+        # ещё не получить эти изменения.
+        if replica_snapshot():
+            return None
+        return last_modified(scopes(request, *args, **kwargs))
+
+    return condition(etag_func=etag, last_modified_func=modified)
+
+
+def index_scopes(request):
+    return [FEED_SCOPE]
+
+
+def top_scopes(request):
+    return [RANKING_SCOPE, FEED_SCOPE]
+
+
+def group_scopes(request, slug):
+    return [group_scope(group_for(request, slug).id)]
+
+
+def profile_scopes(request, username):
+    scopes = [author_scope(author_for(request, username).id)]
+    if request.user.is_authenticated:
+        # Рекомендации читателя: пересборка и его собственные подписки.
+        scopes += [RECOMMENDATIONS_SCOPE, author_scope(request.user.id)]
+    return scopes
+
+
+def post_detail_scopes(request, post_id):
+    post = post_for(request, post_id)
+    return [post_scope(post.id), author_scope(post.author_id)]
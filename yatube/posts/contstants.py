@@ -9,3 +9,134 @@ NAME_USERS = ['Лёлик', 'Болик']
 
 CONSTRAINT_VARIABLE = 15
 """Переменная для моделей"""
+
+FEED_ORDERING = ('-pub_date', '-id')
+"""Ключ сортировки лент постов для keyset-пагинации"""
+
+MAX_PAGE_NUMBER = 10 ** 9
+"""Больший ``?page=N`` урезается: OFFSET должен поместиться в целое базы"""
+
+FEED_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'comments_count', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__title', 'group__slug',
+)
+"""Колонки, которые нужны карточке поста в ленте"""
+
+FEED_API_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'image': 'image',
+    'comments_count': 'comments_count',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'group_title': 'group__title',
+}
+"""Поля поста в JSON-ленте и выражения ``values()``, из которых они берутся"""
+
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+"""Ключ сортировки материализованной ленты подписок"""
+
+TIMELINE_CELEBRITY_FOLLOWERS = 1000
+"""Порог подписчиков, после которого посты автора не рассылаются
+по лентам, а подтягиваются при чтении"""
+
+TIMELINE_BACKFILL_LIMIT = 500
+"""Сколько последних постов автора добавлять в ленту при подписке"""
+
+TIMELINE_BATCH_SIZE = 500
+"""Размер пачки bulk_create при рассылке поста"""
+
+CARD_CACHE_TIMEOUT = 60 * 60
+"""Время жизни закешированной карточки поста, в секундах"""
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+"""Время жизни закешированной страницы ленты. Страницы сбрасываются
+сдвигом поколения, поэтому TTL может быть длинным"""
+
+FEED_STATS_FLUSH_EVERY = 100
+"""Сколько событий статистики кеша копится в процессе до записи в кеш"""
+
+THUMBNAIL_GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+"""Размеры миниатюр, которые выводят шаблоны постов"""
+
+KVSTORE_MEMORY_SIZE = 10000
+"""Сколько записей о миниатюрах держать в памяти процесса"""
+
+KVSTORE_MISS_TTL = 10
+"""Сколько секунд помнить, что миниатюры ещё нет"""
+
+KVSTORE_ENTRY_TTL = 600
+"""Сколько секунд запись о миниатюре живёт в памяти процесса"""
+
+KVSTORE_SYNC_INTERVAL = 1
+"""Как часто, в секундах, процесс сверяет поколение записей о миниатюрах"""
+
+COUNT_STALENESS = 60
+"""Насколько устаревшим, в секундах, может быть общее число записей"""
+
+COMMENTS_PER_PAGE = 20
+"""Сколько комментариев выводить за одну порцию"""
+
+COMMENT_ORDERING = ('created', 'id')
+"""Ключ сортировки комментариев для keyset-пагинации"""
+
+BENCHMARK_BATCH_SIZE = 1000
+"""Размер пачки при генерации данных для нагрузочного теста"""
+
+BENCHMARK_BASELINE = 'benchmarks/baseline.json'
+"""Куда сохраняются опорные замеры, относительно BASE_DIR"""
+
+IMAGE_MAX_DIMENSION = 1920
+"""Наибольшая сторона загруженной картинки после обработки, в пикселях"""
+
+IMAGE_FORMAT = 'JPEG'
+"""Формат, в который перекодируются загрузки: 'JPEG' или 'WEBP'"""
+
+IMAGE_QUALITY = 85
+"""Качество сжатия при перекодировании загрузок"""
+
+IMAGE_ORIGINALS_DIR = 'posts/originals/'
+"""Куда переносятся исходные файлы, если их нужно сохранять"""
+
+MEDIA_GC_GRACE = 3600
+"""Сколько секунд новый файл без ссылок не считается мусором"""
+
+RANKING_ORDERING = ('-score', '-post_id')
+"""Ключ сортировки ленты «Популярное» по материализованному рейтингу"""
+
+RANKING_WINDOW_DAYS = 7
+"""Посты старше этого числа дней в рейтинг не попадают"""
+
+RANKING_CANDIDATES = 1000
+"""Сколько самых свежих постов окна ранжировать при пересчёте"""
+
+RANKING_HALF_LIFE_HOURS = 24
+"""За сколько часов вдвое падает рейтинг поста из-за возраста"""
+
+RANKING_VELOCITY_HALF_LIFE_HOURS = 6
+"""За сколько часов вдвое падает вклад одного комментария в скорость"""
+
+RANKING_COMMENT_WEIGHT = 1.0
+"""Вес скорости комментирования в рейтинге"""
+
+RANKING_FOLLOWER_WEIGHT = 0.5
+"""Вес логарифма числа подписчиков автора в рейтинге"""
+
+RECOMMENDATIONS_TOP_K = 20
+"""Сколько рекомендаций подписок хранить на пользователя"""
+
+RECOMMENDATIONS_SHOWN = 5
+"""Сколько рекомендаций показывать на странице"""
+
+RECOMMENDATIONS_FOF_WEIGHT = 1.0
+"""Вес общих подписок: на автора подписаны те, на кого подписан пользователь"""
+
+RECOMMENDATIONS_COFOLLOW_WEIGHT = 1.0
+"""Вес совместных подписок: автора читают вместе с авторами пользователя"""
+
+RECOMMENDATIONS_FANOUT_LIMIT = 200
+"""Сколько подписчиков автора просматривать при поиске совместных подписок"""
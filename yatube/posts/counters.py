@@ -0,0 +1,119 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+from .utils import insert_batch_size
+
+
+def _count(queryset, field):
+    """Коррелированный подзапрос COUNT(*) по полю ``field``."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def bump_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя; нет строки — считает заново."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    for field, delta in deltas.items():
+        if delta < 0:
+            stats = stats.filter(**{f'{field}__gte': -delta})
+    with transaction.atomic():
+        updated = stats.update(**{
+            field: F(field) + delta for field, delta in deltas.items()
+        })
+        if not updated and User.objects.filter(pk=user_id).exists():
+            create_stats(user_id)
+
+
+def create_stats(user_id):
+    """Заводит строку счётчиков, досчитывая их по таблицам."""
+    stats, _ = UserStats.objects.get_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id).count(),
+        },
+    )
+    return stats
+
+
+def bump_comments(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def reconcile_posts(batch_size, post_ids=None):
+    """Исправляет comments_count у постов. Возвращает число исправлений.
+
+    ``post_ids`` ограничивает проверку этими постами.
+    """
+    posts = Post.objects.all()
+    if post_ids is not None:
+        posts = posts.filter(pk__in=post_ids)
+    posts = posts.annotate(
+        real=_count(Comment.objects.all(), 'post')
+    ).values_list('pk', 'comments_count', 'real')
+    fixed = [
+        Post(pk=pk, comments_count=real)
+        for pk, stored, real in posts.iterator(chunk_size=batch_size)
+        if stored != real
+    ]
+    Post.objects.bulk_update(fixed, ['comments_count'], batch_size=batch_size)
+    return len(fixed)
+
+
+def reconcile_users(batch_size, user_ids=None):
+    """Пересчитывает UserStats всех пользователей пачками.
+
+    ``user_ids`` ограничивает пересчёт этими пользователями.
+    """
+    users = User.objects.all()
+    stored = UserStats.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        stored = stored.filter(user_id__in=user_ids)
+    users = users.annotate(
+        real_posts=_count(Post.objects.all(), 'author'),
+        real_followers=_count(Follow.objects.all(), 'author'),
+        real_following=_count(Follow.objects.all(), 'user'),
+    ).values_list('pk', 'real_posts', 'real_followers', 'real_following')
+    stored = {stats.pk: stats for stats in stored.iterator()}
+    to_create, to_update = [], []
+    for pk, posts, followers, following in users.iterator(
+            chunk_size=batch_size):
+        real = UserStats(
+            user_id=pk,
+            posts_count=posts,
+            followers_count=followers,
+            following_count=following,
+        )
+        current = stored.get(pk)
+        if current is None:
+            to_create.append(real)
+        elif (current.posts_count, current.followers_count,
+              current.following_count) != (posts, followers, following):
+            to_update.append(real)
+    UserStats.objects.bulk_create(
+        to_create, batch_size=insert_batch_size(UserStats, batch_size)
+    )
+    UserStats.objects.bulk_update(
+        to_update,
+        ['posts_count', 'followers_count', 'following_count'],
+        batch_size=batch_size,
+    )
+    return len(to_create) + len(to_update)
@@ -0,0 +1,75 @@
+import time
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+
+from core.db_router import replica_snapshot
+from .contstants import COUNT_STALENESS
+
+
+def sqlite_estimate(model):
+    """Число строк таблицы из статистики ``sqlite_stat1``.
+
+    Статистику собирает ``ANALYZE``; пока её нет, возвращает None.
+    """
+    if connection.vendor != 'sqlite':
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s '
+                'ORDER BY idx IS NOT NULL LIMIT 1',
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    return int(row[0].split()[0])
+
+
+def _count_key(prefix, key):
+    """Числа, посчитанные по реплике, хранятся под меткой её снимка."""
+    snapshot = replica_snapshot()
+    return f'{prefix}:{key}@{snapshot}' if snapshot else f'{prefix}:{key}'
+
+
+def cached_count(queryset, key, timeout=COUNT_STALENESS):
+    """Число записей, которое пересчитывается не чаще раза в ``timeout``."""
+    key = _count_key('posts:count', key)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+def estimated_count(queryset, key, timeout=COUNT_STALENESS):
+    """Число записей, устаревшее не больше чем на ``timeout`` секунд.
+
+    Точное число хранится в кеше вместе с моментом подсчёта. Когда
+    оно старше ``timeout``, пересчитывает один запрос, а остальные
+    тем временем получают прежнее точное число. Статистика SQLite,
+    возраст которой неизвестен, отдаётся, только пока точного числа
+    ещё нет, а его уже считает другой запрос.
+    """
+    key = _count_key('posts:estimate', key)
+    cached = cache.get(key)
+    if cached is not None and time.time() - cached[1] < timeout:
+        return cached[0]
+    lock = f'{key}:counting'
+    if not cache.add(lock, True, timeout):
+        if cached is not None:
+            return cached[0]
+        if not queryset.query.where:
+            estimate = sqlite_estimate(queryset.model)
+            if estimate is not None:
+                return estimate
+    try:
+        counted_at = time.time()
+        count = queryset.count()
+        cache.set(key, (count, counted_at), None)
+    finally:
+        cache.delete(lock)
+    return count
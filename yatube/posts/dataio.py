@@ -0,0 +1,367 @@
+import csv
+import json
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, media, ranking, search, timeline
+from .models import Comment, Follow, Group, Post, User
+from .utils import insert_batch_size
+
+MODEL_ORDER = ('group', 'post', 'comment', 'follow')
+"""Порядок загрузки: каждая модель ссылается только на предыдущие."""
+
+EXPORT_FIELDS = {
+    'group': {
+        'id': 'id',
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+    },
+    'post': {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    },
+    'comment': {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    },
+    'follow': {
+        'user': 'user__username',
+        'author': 'author__username',
+    },
+}
+"""Колонки выгрузки. Пользователи и группы идут по username и slug,
+чтобы дамп можно было загрузить в базу с другими id."""
+
+MODELS = {
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+
+
+class Progress:
+    """Печатает число обработанных строк и скорость."""
+
+    def __init__(self, stream, label, every):
+        self.stream = stream
+        self.label = label
+        self.every = every
+        self.count = 0
+        self.started = time.monotonic()
+
+    def _report(self):
+        elapsed = time.monotonic() - self.started or 1e-9
+        self.stream.write(
+            f'{self.label}: {self.count} строк, '
+            f'{self.count / elapsed:.0f} строк/с\n'
+        )
+
+    def tick(self, rows=1):
+        before = self.count // self.every
+        self.count += rows
+        if self.count // self.every > before:
+            self._report()
+
+    def finish(self):
+        self._report()
+
+
+def _serialize(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return '' if value is None else value
+
+
+def export_rows(model_name, chunk_size):
+    """Построчно отдаёт словари для выгрузки, не держа таблицу в памяти."""
+    fields = EXPORT_FIELDS[model_name]
+    queryset = MODELS[model_name].objects.order_by('pk').values_list(
+        *fields.values()
+    )
+    for values in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            name: _serialize(value)
+            for name, value in zip(fields, values)
+        }
+
+
+def write_jsonl(stream, model_name, rows):
+    for row in rows:
+        stream.write(json.dumps({'model': model_name, **row},
+                                ensure_ascii=False))
+        stream.write('\n')
+        yield
+
+
+def write_csv(stream, model_name, rows):
+    writer = csv.DictWriter(stream, fieldnames=list(EXPORT_FIELDS[model_name]))
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            row = json.loads(line)
+            yield row.pop('model'), row
+
+
+def read_csv(stream, model_name):
+    for row in csv.DictReader(stream):
+        yield model_name, row
+
+
+DATE_FIELDS = {'post': 'pub_date', 'comment': 'created'}
+"""Поля с auto_now_add: после вставки им возвращаются даты из дампа."""
+
+KEEP_IDS = ('group', 'post', 'comment')
+"""Модели, которые загружаются со своими id из дампа."""
+
+
+class Importer:
+    """Копит строки пачками и сохраняет их через bulk_create.
+
+    Ссылки на пользователей и группы разрешаются одним запросом
+    на пачку; отсутствующие пользователи создаются без пароля.
+    Группы, посты и комментарии сохраняют id из дампа, поэтому
+    загружаются только в пустые таблицы. Каждая пачка сохраняется
+    своей транзакцией вместе со счётчиками, лентами и индексом
+    затронутых ею строк.
+    """
+
+    def __init__(self, batch_size, progress_stream, progress_every):
+        self.batch_size = batch_size
+        self.progress_stream = progress_stream
+        self.progress_every = progress_every
+        self.batches = {name: [] for name in MODEL_ORDER}
+        self.progress = {}
+        self.loaded = dict.fromkeys(MODEL_ORDER, 0)
+        self.checked = set()
+
+    def add(self, model_name, row):
+        if model_name not in MODELS:
+            raise ValueError(f'Неизвестная модель: {model_name}')
+        batch = self.batches[model_name]
+        batch.append(row)
+        if len(batch) >= self.batch_size:
+            self.flush(model_name)
+
+    def flush(self, model_name=None):
+        names = MODEL_ORDER if model_name is None else (model_name,)
+        for name in names:
+            # Строки-родители должны попасть в базу раньше детей.
+            for parent in MODEL_ORDER[:MODEL_ORDER.index(name)]:
+                if self.batches[parent]:
+                    self._save(parent)
+            if self.batches[name]:
+                self._save(name)
+
+    def finish(self):
+        self.flush()
+        ranking.refresh()
+        for progress in self.progress.values():
+            progress.finish()
+        return self.loaded
+
+    def _check_empty(self, model_name):
+        """Id из дампа нельзя смешивать с уже существующими строками."""
+        if model_name in self.checked or model_name not in KEEP_IDS:
+            return
+        if MODELS[model_name].objects.exists():
+            raise ValueError(
+                f'Таблица {model_name} не пуста: дамп загружается '
+                'только в пустую базу.'
+            )
+        self.checked.add(model_name)
+
+    def _users(self, usernames):
+        usernames = set(usernames)
+        users = dict(
+            User.objects.filter(username__in=usernames)
+            .values_list('username', 'id')
+        )
+        missing = usernames - set(users)
+        if missing:
+            User.objects.bulk_create(
+                [
+                    User(username=username, password=make_password(None))
+                    for username in missing
+                ],
+                batch_size=insert_batch_size(User, self.batch_size),
+                ignore_conflicts=True,
+            )
+            users.update(
+                User.objects.filter(username__in=missing)
+                .values_list('username', 'id')
+            )
+        return users
+
+    def _groups(self, slugs):
+        return dict(
+            Group.objects.filter(slug__in=set(slugs) - {''})
+            .values_list('slug', 'id')
+        )
+
+    def _new_follows(self, follows):
+        """Подписки пачки без повторов и без уже сохранённых."""
+        existing = set(
+            Follow.objects.filter(
+                user_id__in={follow.user_id for follow in follows},
+                author_id__in={follow.author_id for follow in follows},
+            ).values_list('user_id', 'author_id')
+        )
+        fresh = []
+        for follow in follows:
+            pair = (follow.user_id, follow.author_id)
+            if pair not in existing:
+                existing.add(pair)
+                fresh.append(follow)
+        return fresh
+
+    def _repair(self, model_name, objects):
+        """Делает для пачки то, что при обычном сохранении делают сигналы.
+
+        bulk_create не отправляет post_save, поэтому счётчики, ленты
+        подписок и поисковый индекс затронутых строк приводятся
+        в порядок здесь. Возвращает id постов и области кеша, которые
+        устарели: их сбрасывают после коммита.
+        """
+        if model_name == 'post':
+            counters.reconcile_users(
+                self.batch_size, user_ids={post.author_id for post in objects}
+            )
+            media.reconcile(
+                self.batch_size,
+                names={post.image.name for post in objects if post.image},
+            )
+            timeline.fan_out_posts(objects)
+            search.index_many(
+                'post', [(post.id, post.id, post.text) for post in objects]
+            )
+            return set(), {
+                scope for post in objects
+                for scope in caching.post_scopes(post)
+            }
+        if model_name == 'comment':
+            post_ids = {comment.post_id for comment in objects}
+            counters.reconcile_posts(self.batch_size, post_ids=post_ids)
+            search.index_many(
+                'comment',
+                [(comment.id, comment.post_id, comment.text)
+                 for comment in objects],
+            )
+            posts = Post.objects.filter(pk__in=post_ids).only(
+                'id', 'author_id', 'group_id'
+            )
+            return post_ids, {
+                scope for post in posts
+                for scope in caching.post_scopes(post)
+            }
+        if model_name == 'follow':
+            user_ids = {
+                user_id for follow in objects
+                for user_id in (follow.user_id, follow.author_id)
+            }
+            counters.reconcile_users(self.batch_size, user_ids=user_ids)
+            timeline.backfill_follows(objects)
+            return set(), {
+                caching.author_scope(user_id) for user_id in user_ids
+            }
+        return set(), set()
+
+    def _build(self, model_name, rows):
+        if model_name == 'group':
+            return [
+                Group(
+                    id=row.get('id') or None,
+                    title=row['title'],
+                    slug=row['slug'],
+                    description=row['description'],
+                )
+                for row in rows
+            ]
+        if model_name == 'post':
+            users = self._users(row['author'] for row in rows)
+            groups = self._groups(row.get('group') or '' for row in rows)
+            return [
+                Post(
+                    id=int(row['id']),
+                    text=row['text'],
+                    pub_date=parse_datetime(row['pub_date']),
+                    author_id=users[row['author']],
+                    group_id=groups.get(row.get('group') or ''),
+                    image=row.get('image') or '',
+                )
+                for row in rows
+            ]
+        if model_name == 'comment':
+            users = self._users(row['author'] for row in rows)
+            return [
+                Comment(
+                    id=int(row['id']),
+                    post_id=row['post'],
+                    author_id=users[row['author']],
+                    text=row['text'],
+                    created=parse_datetime(row['created']),
+                )
+                for row in rows
+            ]
+        users = self._users(
+            name for row in rows for name in (row['user'], row['author'])
+        )
+        return self._new_follows([
+            Follow(user_id=users[row['user']], author_id=users[row['author']])
+            for row in rows
+        ])
+
+    def _insert(self, model_name, objects):
+        model = MODELS[model_name]
+        batch_size = insert_batch_size(model, self.batch_size)
+        date_field = DATE_FIELDS.get(model_name)
+        if date_field is None:
+            model.objects.bulk_create(
+                objects, batch_size=batch_size,
+                ignore_conflicts=model_name == 'follow',
+            )
+            return
+        # auto_now_add перезаписывает даты при вставке,
+        # поэтому они возвращаются отдельным UPDATE.
+        dates = [getattr(obj, date_field) for obj in objects]
+        model.objects.bulk_create(objects, batch_size=batch_size)
+        for obj, date in zip(objects, dates):
+            setattr(obj, date_field, date)
+        model.objects.bulk_update(objects, [date_field], batch_size=batch_size)
+
+    def _save(self, model_name):
+        rows = self.batches[model_name]
+        self.batches[model_name] = []
+        with transaction.atomic():
+            self._check_empty(model_name)
+            objects = self._build(model_name, rows)
+            self._insert(model_name, objects)
+            post_ids, scopes = self._repair(model_name, objects)
+        for post_id in post_ids:
+            caching.bump_post_version(post_id)
+        if scopes:
+            caching.bump_generations(*scopes)
+        self.loaded[model_name] += len(objects)
+        if model_name not in self.progress:
+            self.progress[model_name] = Progress(
+                self.progress_stream, model_name, self.progress_every
+            )
+        self.progress[model_name].tick(len(rows))
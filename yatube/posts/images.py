@@ -0,0 +1,103 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from core import background
+from . import media
+from .caching import invalidate_post
+from .contstants import (
+    IMAGE_FORMAT,
+    IMAGE_MAX_DIMENSION,
+    IMAGE_ORIGINALS_DIR,
+    IMAGE_QUALITY,
+)
+from .models import Post
+from .thumbnails import schedule_thumbnails
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+
+def _encode(image):
+    """Перекодирует картинку; EXIF и прочие метаданные не переносятся."""
+    if IMAGE_FORMAT == 'JPEG' and image.mode != 'RGB':
+        # Прозрачность JPEG не поддерживает: кладём на белый фон.
+        canvas = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        canvas.paste(rgba, mask=rgba.getchannel('A'))
+        image = canvas
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        IMAGE_FORMAT,
+        quality=IMAGE_QUALITY,
+        optimize=True,
+        progressive=True,
+    )
+    return buffer.getvalue()
+
+
+def optimize(file_):
+    """Байты обработанной картинки или None, если её лучше не трогать.
+
+    Учитывает ориентацию из EXIF, уменьшает до IMAGE_MAX_DIMENSION
+    по большей стороне. Анимированные GIF оставляются как есть.
+    """
+    image = Image.open(file_)
+    if getattr(image, 'is_animated', False):
+        return None
+    # JPEG декодируется сразу в уменьшенном масштабе.
+    image.draft('RGB', (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+    return _encode(image)
+
+
+def process_upload(post_id, name):
+    """Заменяет загруженный файл поста обработанным.
+
+    Если за время обработки картинку поста успели сменить, результат
+    выбрасывается. Ссылка на исходник отпускается; при
+    ``IMAGE_KEEP_ORIGINALS`` его копия сохраняется в IMAGE_ORIGINALS_DIR.
+    """
+    field = Post._meta.get_field('image')
+    storage = field.storage
+    with storage.open(name) as file_:
+        data = optimize(file_)
+    if data is None:
+        schedule_thumbnails(Post(image=name).image)
+        return
+    stem = os.path.splitext(os.path.basename(name))[0]
+    new_name = storage.save(
+        f'{field.upload_to}{stem}.{EXTENSIONS[IMAGE_FORMAT]}',
+        ContentFile(data),
+    )
+    # update() минует сигналы, поэтому ссылки учитываются здесь.
+    media.acquire(new_name)
+    updated = Post.objects.filter(pk=post_id, image=name).update(
+        image=new_name
+    )
+    if not updated:
+        media.release(new_name)
+        return
+    if getattr(settings, 'IMAGE_KEEP_ORIGINALS', False):
+        with storage.open(name) as file_:
+            storage.save(IMAGE_ORIGINALS_DIR + os.path.basename(name), file_)
+    media.release(name)
+    post = Post.objects.only('id', 'author', 'group', 'image').get(pk=post_id)
+    invalidate_post(post)
+    schedule_thumbnails(post.image)
+
+
+def schedule_processing(post):
+    """Ставит обработку загруженной картинки в фоновый пул.
+
+    Ответ на запрос не ждёт обработки: до её окончания пост
+    показывает исходный файл.
+    """
+    if post.image:
+        background.submit(process_upload, post.pk, post.image.name)
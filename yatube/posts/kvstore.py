@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sorl.thumbnail.kvstores.base import KVStoreBase, add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .caching import THUMBNAILS_SCOPE, bump_generations, generations
+from .contstants import (
+    KVSTORE_ENTRY_TTL,
+    KVSTORE_MEMORY_SIZE,
+    KVSTORE_MISS_TTL,
+    KVSTORE_SYNC_INTERVAL,
+)
+
+_MISSING = object()
+
+
+class BulkKVStore(KVStoreBase):
+    """Хранилище метаданных миниатюр sorl с памятью процесса.
+
+    Значения лежат в таблице ``thumbnail_kvstore`` и дублируются
+    в ограниченном LRU-словаре процесса. ``load_many`` поднимает
+    из базы все недостающие ключи страницы одним запросом, после
+    чего теги шаблона находят миниатюры без обращений к базе.
+    Отсутствие ключа помнится ``KVSTORE_MISS_TTL`` секунд, чтобы
+    миниатюра, нарезанная другим процессом, появилась без рестарта,
+    найденная запись — ``KVSTORE_ENTRY_TTL`` секунд. Удаление сдвигает
+    поколение в общем кеше, и остальные процессы, сверив его,
+    забывают всё, что помнили.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._synced_at = None
+
+    def _sync(self):
+        """Сбрасывает память, если другой процесс удалял записи."""
+        now = time.monotonic()
+        if (self._synced_at is not None
+                and now - self._synced_at < KVSTORE_SYNC_INTERVAL):
+            return
+        self._synced_at = now
+        generation = generations([THUMBNAILS_SCOPE])[THUMBNAILS_SCOPE]
+        with self._lock:
+            if generation != self._generation:
+                self._memory.clear()
+                self._generation = generation
+
+    def _remember(self, key, value):
+        entry = (value, time.monotonic())
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > KVSTORE_MEMORY_SIZE:
+                self._memory.popitem(last=False)
+
+    def _recall(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            ttl = KVSTORE_MISS_TTL if value is _MISSING else KVSTORE_ENTRY_TTL
+            if time.monotonic() - stored_at > ttl:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return entry
+
+    def load_many(self, raw_keys):
+        """Загружает в память все ключи, которых там ещё нет."""
+        self._sync()
+        missing = [key for key in set(raw_keys) if self._recall(key) is None]
+        if not missing:
+            return
+        found = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        for key in missing:
+            self._remember(key, found.get(key, _MISSING))
+
+    def forget(self):
+        with self._lock:
+            self._memory.clear()
+
+    def _get_raw(self, key):
+        self._sync()
+        entry = self._recall(key)
+        if entry is None:
+            self.load_many([key])
+            entry = self._recall(key)
+        value = entry[0]
+        return None if value is _MISSING else value
+
+    def _set_raw(self, key, value):
+        KVStoreModel.objects.update_or_create(
+            key=key, defaults={'value': value}
+        )
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        KVStoreModel.objects.filter(key__in=keys).delete()
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+        bump_generations(THUMBNAILS_SCOPE)
+
+    def _find_keys_raw(self, prefix):
+        return KVStoreModel.objects.filter(
+            key__startswith=prefix
+        ).values_list('key', flat=True)
+
+
+def image_key(image_file):
+    """Сырой ключ записи о картинке в хранилище."""
+    return add_prefix(image_file.key, 'image')
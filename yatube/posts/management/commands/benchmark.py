@@ -0,0 +1,155 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from posts.benchmark import compare, generate, measure, scenarios
+from posts.contstants import BENCHMARK_BASELINE
+
+BENCHMARK_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    'BACKGROUND_TASKS_SYNC': True,
+    'DATABASE_REPLICAS': [],
+}
+"""Замеры не трогают общий кеш и реплики и не запускают фоновые потоки."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест лент: число запросов, p50/p99 и память '
+        'на синтетических данных нескольких размеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[1000, 5000],
+            help='Число постов в каждом прогоне.',
+        )
+        parser.add_argument(
+            '--users-ratio',
+            type=float,
+            default=0.1,
+            help='Сколько пользователей на один пост.',
+        )
+        parser.add_argument(
+            '--follow-density',
+            type=float,
+            default=0.01,
+            help='Доля авторов, на которых подписан пользователь.',
+        )
+        parser.add_argument(
+            '--comments-per-post',
+            type=int,
+            default=2,
+        )
+        parser.add_argument(
+            '--comment-skew',
+            type=float,
+            default=1.2,
+            help='Показатель Ципфа для распределения комментариев.',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Сколько запросов на сценарий для перцентилей.',
+        )
+        parser.add_argument(
+            '--warm',
+            action='store_true',
+            help='Не очищать кеш между запросами.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(settings.BASE_DIR, BENCHMARK_BASELINE),
+            help='Файл с опорными замерами.',
+        )
+        parser.add_argument(
+            '--save',
+            action='store_true',
+            help='Записать результаты как новые опорные.',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Допустимый рост времени и памяти, доля.',
+        )
+
+    def run_size(self, size, options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            objects = generate(
+                posts=size,
+                users=max(2, int(size * options['users_ratio'])),
+                follow_density=options['follow_density'],
+                comments_per_post=options['comments_per_post'],
+                comment_skew=options['comment_skew'],
+                seed=options['seed'],
+            )
+            results = {}
+            for name, url, user in scenarios(objects):
+                results[name] = measure(
+                    url, user, options['requests'], options['warm']
+                )
+                self.stdout.write(
+                    '{:>7} {:<13} запросов {queries:>3}  '
+                    'p50 {p50_ms:>8.2f} мс  p99 {p99_ms:>8.2f} мс  '
+                    'память {peak_kb:>8.1f} КБ'.format(
+                        size, name, **results[name]
+                    )
+                )
+            return results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        try:
+            with override_settings(**BENCHMARK_SETTINGS):
+                results = {
+                    str(size): self.run_size(size, options)
+                    for size in options['sizes']
+                }
+        finally:
+            teardown_test_environment()
+
+        path = options['baseline']
+        if options['save']:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as stream:
+                json.dump(results, stream, indent=2, sort_keys=True)
+                stream.write('\n')
+            self.stdout.write(self.style.SUCCESS(f'Сохранено в {path}'))
+            return
+        if not os.path.exists(path):
+            return
+        with open(path, encoding='utf-8') as stream:
+            regressions = compare(
+                results, json.load(stream), options['tolerance']
+            )
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно {}:\n{}'.format(
+                    path, '\n'.join(regressions)
+                )
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
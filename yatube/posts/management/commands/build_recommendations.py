@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts.contstants import RECOMMENDATIONS_TOP_K
+from posts.recommendations import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «на кого подписаться» по графу '
+        'подписок. Запускается периодически, например раз в сутки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=RECOMMENDATIONS_TOP_K,
+            help='Сколько рекомендаций хранить на пользователя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько рекомендаций записывать за раз.',
+        )
+
+    def handle(self, *args, **options):
+        saved = rebuild(options['top_k'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено рекомендаций: {saved}'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts.caching import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания, промахи и инвалидации кеша лент.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить счётчики после вывода.',
+        )
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        requests = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / requests * 100 if requests else 0
+        self.stdout.write(
+            f"Попаданий: {stats['hits']}\n"
+            f"Промахов: {stats['misses']}\n"
+            f"Инвалидаций: {stats['invalidations']}\n"
+            f'Доля попаданий: {hit_rate:.1f}%'
+        )
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счётчики обнулены.'))
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.dataio import (
+    MODEL_ORDER,
+    Progress,
+    export_rows,
+    write_csv,
+    write_jsonl,
+)
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает группы, посты, комментарии и подписки.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            choices=MODEL_ORDER,
+            default=list(MODEL_ORDER),
+            help='Какие модели выгружать.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('jsonl', 'csv'),
+            default='jsonl',
+            help='jsonl — все модели в одном файле, csv — одна модель.',
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='Файл для записи, «-» — стандартный вывод.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из базы за один запрос.',
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=10000,
+            help='Как часто печатать прогресс, в строках.',
+        )
+
+    def handle(self, *args, **options):
+        models = [name for name in MODEL_ORDER if name in options['models']]
+        if options['format'] == 'csv' and len(models) != 1:
+            raise CommandError('Для csv укажите ровно одну модель.')
+        writer = write_csv if options['format'] == 'csv' else write_jsonl
+        if options['output'] == '-':
+            # Строки уже заканчиваются переводом строки.
+            self.stdout.ending = ''
+            stream = self.stdout
+        else:
+            stream = open(options['output'], 'w', encoding='utf-8',
+                          newline='')
+        try:
+            for name in models:
+                progress = Progress(
+                    self.stderr, name, options['progress_every']
+                )
+                rows = export_rows(name, options['batch_size'])
+                for _ in writer(stream, name, rows):
+                    progress.tick()
+                progress.finish()
+        finally:
+            if stream is not self.stdout:
+                stream.close()
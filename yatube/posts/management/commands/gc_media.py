@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from posts.media import collect_garbage, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает ссылки на картинки и удаляет файлы, '
+        'на которые не ссылается ни один пост.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при пересчёте ссылок.',
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile(options['batch_size'])
+        orphans = collect_garbage(dry_run=options['dry_run'])
+        for name in orphans:
+            self.stdout.write(name)
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков: {fixed}. {action} файлов: {len(orphans)}'
+        ))
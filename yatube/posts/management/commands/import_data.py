@@ -0,0 +1,69 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts.dataio import MODEL_ORDER, Importer, read_csv, read_jsonl
+
+
+class Command(BaseCommand):
+    help = 'Потоково загружает данные, выгруженные командой export_data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл с данными, «-» — стандартный ввод.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('jsonl', 'csv'),
+            help='По умолчанию определяется по расширению файла.',
+        )
+        parser.add_argument(
+            '--model',
+            choices=MODEL_ORDER,
+            help='Модель строк csv-файла.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк сохранять одним bulk_create.',
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=10000,
+            help='Как часто печатать прогресс, в строках.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        if data_format == 'csv' and not options['model']:
+            raise CommandError('Для csv укажите --model.')
+        stream = (
+            sys.stdin if path == '-'
+            else open(path, encoding='utf-8', newline='')
+        )
+        if data_format == 'csv':
+            rows = read_csv(stream, options['model'])
+        else:
+            rows = read_jsonl(stream)
+        importer = Importer(
+            options['batch_size'], self.stderr, options['progress_every']
+        )
+        try:
+            for model_name, row in rows:
+                importer.add(model_name, row)
+            loaded = importer.finish()
+        except (KeyError, ValueError, IntegrityError) as error:
+            raise CommandError(f'Некорректные данные: {error!r}')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            f'{name}: {count}' for name, count in loaded.items()
+        )))
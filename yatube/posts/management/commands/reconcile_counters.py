@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import reconcile_posts, reconcile_users
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при чтении и записи.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            posts = reconcile_posts(batch_size)
+            users = reconcile_users(batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено постов: {posts}, пользователей: {users}'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.ranking import refresh
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг свежих постов для ленты «Популярное». '
+        'Запускается периодически, например раз в несколько минут.'
+    )
+
+    def handle(self, *args, **options):
+        count = refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов в рейтинге: {count}'
+        ))
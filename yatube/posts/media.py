@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_with_thumbnails
+
+from .contstants import IMAGE_ORIGINALS_DIR, MEDIA_GC_GRACE
+from .models import MediaFile, Post
+
+
+def _field():
+    return Post._meta.get_field('image')
+
+
+def _delete(name):
+    # Ключи миниатюр sorl зависят от хранилища исходника, поэтому
+    # файл передаётся через поле, а не строкой.
+    delete_with_thumbnails(Post(image=name).image)
+
+
+def acquire(name):
+    """Пост начал ссылаться на файл."""
+    if not name:
+        return
+    updated = MediaFile.objects.filter(name=name).update(
+        refcount=F('refcount') + 1
+    )
+    if not updated:
+        _, created = MediaFile.objects.get_or_create(
+            name=name, defaults={'refcount': 1}
+        )
+        if not created:
+            acquire(name)
+
+
+def _delete_file(name):
+    """Удаляет файл и его миниатюры, если ссылок так и не появилось."""
+    if MediaFile.objects.filter(name=name, refcount__gt=0).exists():
+        return
+    count = Post.objects.filter(image=name).count()
+    if count:
+        # Счётчик разошёлся с постами (например, после bulk_create).
+        MediaFile.objects.update_or_create(
+            name=name, defaults={'refcount': count}
+        )
+        return
+    MediaFile.objects.filter(name=name, refcount=0).delete()
+    _delete(name)
+
+
+def release(name):
+    """Пост перестал ссылаться на файл; последний удаляет файл.
+
+    Для файлов без строки счётчика (загруженных до его появления)
+    ссылки пересчитываются по постам. Сам файл удаляется после
+    коммита, чтобы откат не оставил посты без картинки.
+    """
+    if not name:
+        return
+    released = MediaFile.objects.filter(name=name, refcount__gt=0).update(
+        refcount=F('refcount') - 1
+    )
+    if released:
+        orphan = MediaFile.objects.filter(name=name, refcount=0).exists()
+    else:
+        orphan = not Post.objects.filter(image=name).exists()
+    if orphan:
+        transaction.on_commit(lambda: _delete_file(name))
+
+
+def release_changed(old_name, new_name):
+    """Картинку поста заменили: новую учитываем, старую отпускаем."""
+    if old_name == new_name:
+        return
+    acquire(new_name)
+    release(old_name)
+
+
+def reconcile(batch_size, names=None):
+    """Пересчитывает ссылки по постам. Возвращает число исправлений.
+
+    ``names`` ограничивает пересчёт этими файлами.
+    """
+    posts = Post.objects.exclude(image='')
+    files = MediaFile.objects.all()
+    if names is not None:
+        posts = posts.filter(image__in=names)
+        files = files.filter(name__in=names)
+    real = dict(
+        posts.values('image')
+        .annotate(count=Count('pk')).values_list('image', 'count')
+        .order_by()
+    )
+    fixed = []
+    for media in files.iterator(chunk_size=batch_size):
+        count = real.pop(media.name, 0)
+        if media.refcount != count:
+            media.refcount = count
+            fixed.append(media)
+    MediaFile.objects.bulk_update(fixed, ['refcount'], batch_size=batch_size)
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, refcount=count) for name, count in real.items()]
+    )
+    return len(fixed) + len(real)
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for filename in files:
+        yield directory + filename
+    for child in directories:
+        path = directory + child + '/'
+        if path != IMAGE_ORIGINALS_DIR:
+            yield from _walk(storage, path)
+
+
+def collect_garbage(dry_run=False):
+    """Удаляет файлы картинок, на которые не ссылается ни один пост.
+
+    Сохранённые исходники из IMAGE_ORIGINALS_DIR не трогаются, как
+    и файлы моложе MEDIA_GC_GRACE секунд: их пост может быть ещё
+    не сохранён. Возвращает имена удалённых файлов.
+    """
+    field = _field()
+    storage = field.storage
+    if not storage.exists(field.upload_to):
+        return []
+    # Ссылки берутся из самих постов, а не из счётчиков: ошибка
+    # в счётчике не должна стоить картинки.
+    referenced = set(
+        Post.objects.exclude(image='').order_by()
+        .values_list('image', flat=True).distinct()
+    )
+    fresh = timezone.now() - timedelta(seconds=MEDIA_GC_GRACE)
+    orphans = [
+        name for name in _walk(storage, field.upload_to)
+        if name not in referenced
+        and storage.get_modified_time(name) < fresh
+    ]
+    if not dry_run:
+        for name in orphans:
+            _delete(name)
+    return orphans
@@ -0,0 +1,69 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    UserStats = apps.get_model('posts', 'UserStats')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    comments = Comment.objects.values('post').annotate(
+        count=models.Count('pk')
+    ).values_list('post', 'count')
+    for post_id, count in comments:
+        Post.objects.filter(pk=post_id).update(comments_count=count)
+
+    def counts(queryset, field):
+        return dict(queryset.values(field).annotate(
+            count=models.Count('pk')
+        ).values_list(field, 'count'))
+
+    posts = counts(Post.objects.all(), 'author')
+    followers = counts(Follow.objects.all(), 'author')
+    following = counts(Follow.objects.all(), 'user')
+    UserStats.objects.bulk_create(
+        [
+            UserStats(
+                user_id=pk,
+                posts_count=posts.get(pk, 0),
+                followers_count=followers.get(pk, 0),
+                following_count=following.get(pk, 0),
+            )
+            for pk in User.objects.values_list('pk', flat=True)
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.19 on 2026-10-18 06:17
+
+from django.db import migrations, models
+
+
+def fill_media_files(apps, schema_editor):
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    Post = apps.get_model('posts', 'Post')
+    images = Post.objects.exclude(image='').values('image').annotate(
+        count=models.Count('pk')
+    ).values_list('image', 'count')
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, refcount=count) for name, count in images],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+            },
+        ),
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
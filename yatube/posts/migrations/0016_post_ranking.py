@@ -0,0 +1,32 @@
+# Generated by Django 2.2.19 on 2026-10-18 06:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_media_files'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostRanking',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='posts.Post')),
+                ('score', models.FloatField(default=0, verbose_name='Рейтинг')),
+                ('comment_velocity', models.FloatField(default=0, verbose_name='Скорость комментариев')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков автора')),
+                ('refreshed', models.DateTimeField(verbose_name='Пересчитан')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг поста',
+                'verbose_name_plural': 'Рейтинги постов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postranking',
+            index=models.Index(fields=['-score', '-post'], name='ranking_score_idx'),
+        ),
+    ]
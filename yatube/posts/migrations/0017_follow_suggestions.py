@@ -0,0 +1,37 @@
+# Generated by Django 2.2.19 on 2026-10-18 06:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0016_post_ranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowSuggestion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follow_suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Рекомендация подписки',
+                'verbose_name_plural': 'Рекомендации подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='followsuggestion',
+            index=models.Index(fields=['user', '-score'], name='suggestion_user_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='followsuggestion',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow_suggestion'),
+        ),
+    ]
@@ -28,9 +28,25 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:CONSTRAINT_VARIABLE]
@@ -64,6 +80,11 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ('created',)
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'),
+        ]
 
 
 class Follow(models.Model):
@@ -85,5 +106,165 @@ class Follow(models.Model):
             models.UniqueConstraint(
                 fields=['user', 'author'],
                 name='unique_follow')]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'),
+        ]
         verbose_name = 'Подписка',
         verbose_name_plural = 'Подписки'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry')]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_idx'),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами на Post и Follow, расхождения
+    исправляет команда ``reconcile_counters``.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    @classmethod
+    def for_user(cls, user):
+        """Счётчики пользователя одним чтением, без записи в базу.
+
+        Принимает пользователя или его pk. Строку создаёт сигнал
+        на создание пользователя, а пропавшую восстанавливают
+        сигналы счётчиков и ``reconcile_counters``; до тех пор
+        возвращается несохранённый объект с нулями.
+        """
+        user_id = getattr(user, 'pk', user)
+        try:
+            return cls.objects.get(user_id=user_id)
+        except cls.DoesNotExist:
+            return cls(user_id=user_id)
+
+
+class MediaFile(models.Model):
+    """Счётчик ссылок постов на файл в хранилище по содержимому.
+
+    Один файл может принадлежать нескольким постам; он удаляется,
+    когда счётчик доходит до нуля. Поддерживается сигналами на Post,
+    расхождения исправляет команда ``gc_media``.
+    """
+
+    name = models.CharField('Файл', max_length=255, primary_key=True)
+    refcount = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return self.name
+
+
+class PostRanking(models.Model):
+    """Материализованный рейтинг поста для ленты «Популярное».
+
+    Признаки и рейтинг пересчитываются командой ``refresh_ranking``,
+    лента читает готовые строки по индексу рейтинга.
+    """
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+    )
+    score = models.FloatField('Рейтинг', default=0)
+    comment_velocity = models.FloatField('Скорость комментариев', default=0)
+    followers = models.PositiveIntegerField('Подписчиков автора', default=0)
+    refreshed = models.DateTimeField('Пересчитан')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-score', '-post'],
+                name='ranking_score_idx'),
+        ]
+        verbose_name = 'Рейтинг поста'
+        verbose_name_plural = 'Рейтинги постов'
+
+
+class FollowSuggestion(models.Model):
+    """Рекомендация «на кого подписаться», посчитанная заранее.
+
+    Строки пересобирает команда ``build_recommendations``; подписка
+    на автора убирает его из рекомендаций пользователя сразу.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow_suggestion')]
+        indexes = [
+            models.Index(
+                fields=['user', '-score'],
+                name='suggestion_user_score_idx'),
+        ]
+        verbose_name = 'Рекомендация подписки'
+        verbose_name_plural = 'Рекомендации подписок'
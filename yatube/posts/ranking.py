@@ -0,0 +1,146 @@
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .caching import RANKING_SCOPE, bump_generations
+from .contstants import (
+    FEED_ORDERING,
+    RANKING_CANDIDATES,
+    RANKING_COMMENT_WEIGHT,
+    RANKING_FOLLOWER_WEIGHT,
+    RANKING_HALF_LIFE_HOURS,
+    RANKING_ORDERING,
+    RANKING_VELOCITY_HALF_LIFE_HOURS,
+    RANKING_WINDOW_DAYS,
+)
+from .counts import cached_count
+from .models import Comment, Post, PostRanking
+from .utils import feed_queryset, imitation_of_page
+
+
+def _decay(hours, half_life):
+    return 0.5 ** (max(hours, 0) / half_life)
+
+
+def _hours(delta):
+    return delta.total_seconds() / 3600
+
+
+class DecayRanker:
+    """Свежесть, скорость комментирования и популярность автора.
+
+    ``(1 + w_c·скорость + w_f·ln(1 + подписчики)) · 0.5^(возраст/T)``,
+    где скорость — число комментариев, каждый из которых затухает
+    с периодом полураспада RANKING_VELOCITY_HALF_LIFE_HOURS.
+    """
+
+    comment_weight = RANKING_COMMENT_WEIGHT
+    follower_weight = RANKING_FOLLOWER_WEIGHT
+    half_life = RANKING_HALF_LIFE_HOURS
+
+    def score(self, features):
+        return (
+            1
+            + self.comment_weight * features['comment_velocity']
+            + self.follower_weight * math.log1p(features['followers'])
+        ) * _decay(features['age_hours'], self.half_life)
+
+
+def get_ranker():
+    """Ранжировщик из настройки ``FEED_RANKER``.
+
+    Ранжировщик — класс с методом ``score(features)``; признаки:
+    ``age_hours``, ``comment_velocity`` и ``followers``.
+    """
+    return import_string(
+        getattr(settings, 'FEED_RANKER', 'posts.ranking.DecayRanker')
+    )()
+
+
+@transaction.atomic
+def refresh(now=None):
+    """Пересчитывает признаки и рейтинг кандидатов ленты.
+
+    Кандидаты — RANKING_CANDIDATES самых свежих постов за последние
+    RANKING_WINDOW_DAYS дней. Скорость комментирования обновляется
+    инкрементально: прошлое значение затухает за время с прошлого
+    пересчёта, а читаются только комментарии, появившиеся после него.
+    Посты, выпавшие из окна, удаляются из таблицы. Кеш ленты
+    сбрасывается после коммита. Возвращает число постов в рейтинге.
+    """
+    now = now or timezone.now()
+    last = PostRanking.objects.aggregate(last=Max('refreshed'))['last']
+    candidates = Post.objects.filter(
+        pub_date__gte=now - timedelta(days=RANKING_WINDOW_DAYS)
+    ).order_by(*FEED_ORDERING)[:RANKING_CANDIDATES]
+    rows = list(candidates.values(
+        'id', 'pub_date', 'author__stats__followers_count'
+    ))
+    existing = PostRanking.objects.in_bulk([row['id'] for row in rows])
+
+    comments = Comment.objects.filter(
+        post__in=candidates.values('id'), created__lte=now
+    )
+    if last is not None:
+        comments = comments.filter(
+            Q(created__gt=last) | Q(post__ranking__isnull=True)
+        )
+    fresh = {}
+    for post_id, created in comments.values_list('post_id', 'created'):
+        fresh[post_id] = fresh.get(post_id, 0) + _decay(
+            _hours(now - created), RANKING_VELOCITY_HALF_LIFE_HOURS
+        )
+
+    ranker = get_ranker()
+    updated, created = [], []
+    for row in rows:
+        ranking = existing.get(row['id'])
+        if ranking is None:
+            ranking = PostRanking(post_id=row['id'])
+            created.append(ranking)
+        else:
+            ranking.comment_velocity *= _decay(
+                _hours(now - ranking.refreshed),
+                RANKING_VELOCITY_HALF_LIFE_HOURS,
+            )
+            updated.append(ranking)
+        ranking.comment_velocity += fresh.get(row['id'], 0)
+        ranking.followers = row['author__stats__followers_count'] or 0
+        ranking.refreshed = now
+        ranking.score = ranker.score({
+            'age_hours': _hours(now - row['pub_date']),
+            'comment_velocity': ranking.comment_velocity,
+            'followers': ranking.followers,
+        })
+    PostRanking.objects.bulk_update(
+        updated, ['score', 'comment_velocity', 'followers', 'refreshed']
+    )
+    PostRanking.objects.bulk_create(created)
+    PostRanking.objects.filter(refreshed__lt=now).delete()
+    # Новое поколение — только после коммита, иначе страница,
+    # собранная по старому рейтингу, закешируется под новым ключом.
+    transaction.on_commit(lambda: bump_generations(RANKING_SCOPE))
+    return len(rows)
+
+
+def ranked_page(request):
+    """Страница ленты «Популярное»: диапазон по индексу рейтинга."""
+    rankings = PostRanking.objects.only('post_id', 'score')
+    page_obj = imitation_of_page(
+        request, rankings, RANKING_ORDERING,
+        count=lambda: cached_count(PostRanking.objects.all(), RANKING_SCOPE),
+    )
+    posts = feed_queryset(Post.objects).in_bulk(
+        [ranking.post_id for ranking in page_obj.object_list]
+    )
+    page_obj.object_list = [
+        posts[ranking.post_id]
+        for ranking in page_obj.object_list
+        if ranking.post_id in posts
+    ]
+    return page_obj
@@ -0,0 +1,124 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Comment, Post
+
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def _rowid(kind, obj_id):
+    """Посты и комментарии делят одно пространство rowid индекса."""
+    return obj_id * 2 + (1 if kind == 'comment' else 0)
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def index_text(kind, obj_id, post_id, text):
+    """Добавляет или обновляет текст в полнотекстовом индексе."""
+    if not fts_enabled():
+        return
+    rowid = _rowid(kind, obj_id)
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM posts_search WHERE rowid = %s', [rowid])
+        cursor.execute(
+            'INSERT INTO posts_search (rowid, text, post_id) '
+            'VALUES (%s, %s, %s)',
+            [rowid, text, post_id],
+        )
+
+
+def index_many(kind, rows):
+    """Индексирует пачку ``(id, post_id, text)`` одним проходом."""
+    if not fts_enabled():
+        return
+    rows = [(_rowid(kind, obj_id), text, post_id)
+            for obj_id, post_id, text in rows]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'DELETE FROM posts_search WHERE rowid = %s',
+            [(rowid,) for rowid, _, _ in rows],
+        )
+        cursor.executemany(
+            'INSERT INTO posts_search (rowid, text, post_id) '
+            'VALUES (%s, %s, %s)',
+            rows,
+        )
+
+
+def remove_text(kind, obj_id):
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM posts_search WHERE rowid = %s',
+            [_rowid(kind, obj_id)],
+        )
+
+
+def build_query(text):
+    """Превращает ввод пользователя в безопасный запрос FTS5.
+
+    Каждое слово берётся в кавычки, последнее ищется по префиксу.
+    """
+    words = WORD.findall(text)
+    if not words:
+        return ''
+    terms = ['"{}"'.format(word) for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_post_ids(text, limit, offset=0):
+    """id постов, совпавших по тексту поста или комментариев.
+
+    Результаты упорядочены по BM25 лучшего совпадения (скрытая
+    колонка ``rank`` FTS5). Запрос
+    читает только совпавшие строки индекса, а не всю таблицу.
+    """
+    query = build_query(text)
+    if not query:
+        return []
+    if not fts_enabled():
+        posts = Post.objects.filter(
+            Q(text__icontains=text) | Q(comments__text__icontains=text)
+        ).distinct().order_by('-pub_date', '-id')
+        return list(
+            posts.values_list('id', flat=True)[offset:offset + limit]
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT post_id, MIN(rank) AS score '
+            'FROM posts_search WHERE posts_search MATCH %s '
+            'GROUP BY post_id ORDER BY score, post_id DESC '
+            'LIMIT %s OFFSET %s',
+            [query, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild_index(batch_size):
+    """Перестраивает индекс целиком, например после массовой загрузки."""
+    if not fts_enabled():
+        return
+    sources = (
+        ('post', Post.objects.values_list('id', 'id', 'text')),
+        ('comment', Comment.objects.values_list('id', 'post_id', 'text')),
+    )
+    insert = (
+        'INSERT INTO posts_search (rowid, text, post_id) VALUES (%s, %s, %s)'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM posts_search')
+        for kind, rows in sources:
+            batch = []
+            for obj_id, post_id, text in rows.iterator(chunk_size=batch_size):
+                batch.append((_rowid(kind, obj_id), text, post_id))
+                if len(batch) >= batch_size:
+                    cursor.executemany(insert, batch)
+                    batch = []
+            if batch:
+                cursor.executemany(insert, batch)
@@ -0,0 +1,196 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete,
+)
+from django.dispatch import receiver
+
+from .caching import (
+    author_scope, bump_generations, bump_post_version, post_scopes,
+)
+from . import timeline
+from .counters import bump_comments, bump_user, create_stats
+from .media import acquire, release, release_changed
+from .models import Comment, Follow, FollowSuggestion, Post, User
+from .search import index_text, remove_text
+
+_cascade = threading.local()
+
+
+def _image_name(instance):
+    """Имя картинки, если поле загружено, иначе None."""
+    value = instance.__dict__.get('image')
+    return getattr(value, 'name', value)
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Запоминает исходную группу, чтобы при смене сбросить обе ленты."""
+    instance._initial_group_id = instance.__dict__.get('group_id')
+    instance._initial_image = _image_name(instance)
+
+
+def _invalidate_on_commit(post_ids, scopes):
+    """Сбрасывает карточки и ленты после коммита.
+
+    До коммита параллельный запрос увидел бы новое поколение вместе
+    со старыми данными и закешировал бы их под новым ключом. Области
+    вычисляются сразу: к коммиту объект может измениться.
+    """
+    def invalidate():
+        for post_id in post_ids:
+            bump_post_version(post_id)
+        if scopes:
+            bump_generations(*scopes)
+    transaction.on_commit(invalidate)
+
+
+def _deleting_posts():
+    """id постов, чьи комментарии сейчас удаляются каскадом."""
+    if not hasattr(_cascade, 'post_ids'):
+        _cascade.post_ids = set()
+    return _cascade.post_ids
+
+
+def _in_cascade(comment):
+    return comment.post_id in _deleting_posts()
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    """Комментарии удаляются раньше поста: помечаем их каскад.
+
+    Пост сам сбросит свою карточку и ленты, поэтому обработчики
+    комментариев его каскада пропускают работу с постом.
+    """
+    _deleting_posts().add(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    """Сбрасывает кеш карточки и лент при изменении поста."""
+    _deleting_posts().discard(instance.pk)
+    _invalidate_on_commit(
+        [instance.pk],
+        post_scopes(instance, group_ids=(instance._initial_group_id,)),
+    )
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    """Число комментариев на карточке поста изменилось."""
+    if _in_cascade(instance):
+        return
+    post = Post.objects.filter(pk=instance.post_id).only(
+        'id', 'author', 'group'
+    ).first()
+    if post is None:
+        _invalidate_on_commit([instance.post_id], ())
+        return
+    _invalidate_on_commit([post.id], post_scopes(post))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, **kwargs):
+    """Подписка меняет профили обоих пользователей."""
+    _invalidate_on_commit(
+        [], (author_scope(instance.author_id), author_scope(instance.user_id))
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_drops_suggestion(sender, instance, created, **kwargs):
+    """Автор, на которого подписались, больше не рекомендуется."""
+    if created:
+        FollowSuggestion.objects.filter(
+            user_id=instance.user_id, author_id=instance.author_id
+        ).delete()
+
+
+@receiver(post_save, sender=User)
+def user_created_counters(sender, instance, created, **kwargs):
+    """Строка счётчиков появляется вместе с пользователем, чтобы
+    страницы на чтение её только читали."""
+    if created:
+        create_stats(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def post_created_counters(sender, instance, created, **kwargs):
+    if created:
+        bump_user(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_counters(sender, instance, **kwargs):
+    bump_user(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created_counters(sender, instance, created, **kwargs):
+    if created:
+        bump_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted_counters(sender, instance, **kwargs):
+    if not _in_cascade(instance):
+        bump_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created_counters(sender, instance, created, **kwargs):
+    if created:
+        bump_user(instance.author_id, followers_count=1)
+        bump_user(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted_counters(sender, instance, **kwargs):
+    bump_user(instance.author_id, followers_count=-1)
+    bump_user(instance.user_id, following_count=-1)
+    timeline.follower_lost(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def post_search_index(sender, instance, **kwargs):
+    index_text('post', instance.id, instance.id, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def post_search_remove(sender, instance, **kwargs):
+    remove_text('post', instance.id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_search_index(sender, instance, **kwargs):
+    index_text('comment', instance.id, instance.post_id, instance.text)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_search_remove(sender, instance, **kwargs):
+    remove_text('comment', instance.id)
+
+
+@receiver(post_save, sender=Post)
+def post_image_references(sender, instance, created, **kwargs):
+    """Счётчик ссылок на файлы картинок в хранилище по содержимому."""
+    if 'image' not in instance.__dict__:
+        return
+    name = _image_name(instance)
+    if created:
+        acquire(name)
+    else:
+        release_changed(instance._initial_image, name)
+    instance._initial_image = name
+
+
+@receiver(post_delete, sender=Post)
+def post_image_release(sender, instance, **kwargs):
+    if 'image' in instance.__dict__:
+        release(_image_name(instance))
@@ -0,0 +1,10 @@
+from django import template
+
+from ..thumbnails import ready_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag(name='ready_thumbnail')
+def ready_thumbnail_tag(image, geometry, **options):
+    return ready_thumbnail(image, geometry, **options)
@@ -1,14 +1,34 @@
+import hashlib
+import os
 import shutil
 import tempfile
+import time
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
-from django.test import Client, TestCase, override_settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from sorl.thumbnail import default
 
+from ..contstants import MEDIA_GC_GRACE
 from ..forms import PostForm
-from ..models import Group, Post, Comment, User
+from ..kvstore import BulkKVStore
+from .. import thumbnails
+from ..thumbnails import (
+    generate_thumbnails, ready_thumbnail, schedule_thumbnails,
+)
+from ..models import Group, MediaFile, Post, Comment, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -56,6 +76,15 @@ class PostFormTests(TestCase):
     def setUp(self):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.author)
+        # Память хранилища миниатюр переживает откат транзакции теста.
+        default.kvstore.forget()
+        # Корзины лимита записи живут в общем кеше между запусками.
+        cache.clear()
+
+    @staticmethod
+    def stored_name(directory, content, extension):
+        digest = hashlib.sha256(content).hexdigest()
+        return f'{directory}{digest[:2]}/{digest}{extension}'
 
     def test_authorized_user_publish_posts(self):
         """Авторизованный пользователь может публиковать посты."""
@@ -82,12 +111,159 @@ class PostFormTests(TestCase):
         unicie_post = diff_sets_posts.pop()
 
         self.assertEqual(
-            unicie_post.image, f'posts/{self.uploaded.name}'
+            unicie_post.image,
+            self.stored_name('posts/', self.small_gif, '.gif'),
         )
         self.assertEqual(form_data['author'], unicie_post.author)
         self.assertEqual(form_data['text'], unicie_post.text)
         self.assertEqual(form_data['group'], unicie_post.group.id)
 
+    @override_settings(BACKGROUND_TASKS_SYNC=True)
+    def test_thumbnails_generated_on_upload(self):
+        """Миниатюры нарезаются при загрузке, а не во время рендера."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif', content=self.small_gif, content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertIsNotNone(
+            ready_thumbnail(post.image, '960x339', crop='center', upscale=True)
+        )
+
+    def test_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюры нет, вместо картинки выводится заглушка."""
+        post = Post.objects.create(
+            author=self.author,
+            text='Пост без миниатюры',
+            image=SimpleUploadedFile(
+                name='pending.gif',
+                content=self.small_gif,
+                content_type='image/gif',
+            ),
+        )
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, 'Изображение обрабатывается')
+
+    def test_feed_thumbnails_need_one_metadata_query(self):
+        """Метаданные миниатюр страницы загружаются одним запросом."""
+        for i in range(3):
+            post = Post.objects.create(
+                author=self.author,
+                text=f'Картинка {i}',
+                image=SimpleUploadedFile(
+                    name=f'feed_{i}.gif',
+                    content=self.small_gif,
+                    content_type='image/gif',
+                ),
+            )
+            generate_thumbnails(post.image.name)
+        default.kvstore.forget()
+        cache.clear()
+
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.author}),
+        ):
+            with self.subTest(url=url):
+                default.kvstore.forget()
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                kvstore_queries = [
+                    query for query in queries.captured_queries
+                    if 'thumbnail_kvstore' in query['sql']
+                ]
+                self.assertLessEqual(len(kvstore_queries), 1)
+                self.assertNotContains(response, 'Изображение обрабатывается')
+
+    @mock.patch('posts.kvstore.KVSTORE_SYNC_INTERVAL', 0)
+    def test_kvstore_deletes_reach_other_processes(self):
+        """Удаление записи в одном процессе видно в памяти другого."""
+        post = Post.objects.create(
+            author=self.author,
+            text='Удаляемая картинка',
+            image=SimpleUploadedFile(
+                name='shared.gif',
+                content=self.small_gif,
+                content_type='image/gif',
+            ),
+        )
+        generate_thumbnails(post.image.name)
+        thumbnail = thumbnails.thumbnail_file(
+            post.image, '960x339', crop='center', upscale=True
+        )
+        reader, writer = BulkKVStore(), BulkKVStore()
+        self.assertIsNotNone(reader.get(thumbnail))
+
+        writer.delete(thumbnail)
+
+        self.assertIsNone(reader.get(thumbnail))
+
+    def test_rolled_back_thumbnails_are_not_left_pending(self):
+        """Откат транзакции не оставляет картинку «в очереди» навсегда."""
+        post = Post(image='posts/rolled_back.gif')
+        with mock.patch.object(thumbnails.background, 'submit') as submit:
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    schedule_thumbnails(post.image)
+                    raise DatabaseError
+        submit.assert_not_called()
+        self.assertNotIn(post.image.name, thumbnails._pending)
+
+    @staticmethod
+    def make_photo():
+        """JPEG 400x200 с EXIF: ориентация «повернуть на 90°»."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(
+            buffer, 'JPEG', exif=exif.tobytes()
+        )
+        return buffer.getvalue()
+
+    @override_settings(BACKGROUND_TASKS_SYNC=True)
+    @mock.patch('posts.images.IMAGE_MAX_DIMENSION', 100)
+    def test_upload_is_optimized_in_background(self):
+        """Загрузка уменьшается, поворачивается и теряет EXIF."""
+        photo = self.make_photo()
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Фото', 'image': SimpleUploadedFile(
+                'photo.jpeg', photo, content_type='image/jpeg'
+            )},
+        )
+        post = Post.objects.get(text='Фото')
+        self.assertRegex(post.image.name, r'^posts/\w\w/\w{64}\.jpg$')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertFalse(image.getexif())
+            self.assertTrue(image.info.get('progressive'))
+        original = self.stored_name('posts/', photo, '.jpeg')
+        self.assertFalse(
+            MediaFile.objects.filter(name=original, refcount__gt=0).exists()
+        )
+
+    @override_settings(BACKGROUND_TASKS_SYNC=True, IMAGE_KEEP_ORIGINALS=True)
+    def test_original_can_be_kept(self):
+        """При IMAGE_KEEP_ORIGINALS исходник копируется в originals/."""
+        photo = self.make_photo()
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Исходник', 'image': SimpleUploadedFile(
+                'keep.jpeg', photo, content_type='image/jpeg'
+            )},
+        )
+        self.assertTrue(os.path.exists(os.path.join(
+            TEMP_MEDIA_ROOT,
+            self.stored_name('posts/originals/', photo, '.jpeg'),
+        )))
+
     def test_cant_create_post_without_text(self):
         """Тест на проверку невозможности создать пустой пост."""
         posts_count = Post.objects.count()
@@ -187,3 +363,52 @@ class PostFormTests(TestCase):
             form_fields['post_id'], uniqie_comment.post.id
         )
         self.assertEqual(form_fields['text'], uniqie_comment.text)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaFileTests(TransactionTestCase):
+    """Файл с общим содержимым живёт, пока на него ссылается пост."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='media')
+        self.content = (
+            b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xff\xff\xff!\xf9\x04\x00\x00\x00\x00\x00,\x00\x00\x00'
+            b'\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+        )
+
+    def tearDown(self):
+        # Хранилище само создаст каталог при следующей загрузке.
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, filename):
+        return Post.objects.create(
+            author=self.author,
+            text=filename,
+            image=SimpleUploadedFile(filename, self.content),
+        )
+
+    def test_same_content_shares_file(self):
+        """Одинаковые загрузки хранятся одним файлом со счётчиком."""
+        first = self.create_post('one.gif')
+        second = self.create_post('two.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        path = first.image.path
+        self.assertEqual(MediaFile.objects.get(
+            name=first.image.name).refcount, 2)
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_gc_media_removes_orphans(self):
+        """gc_media удаляет старые файлы без постов."""
+        post = self.create_post('kept.gif')
+        storage = post.image.storage
+        orphan = storage.save('posts/orphan.gif', ContentFile(b'orphan'))
+        old = time.time() - MEDIA_GC_GRACE - 1
+        os.utime(storage.path(orphan), (old, old))
+        call_command('gc_media', stdout=StringIO())
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(post.image.name))
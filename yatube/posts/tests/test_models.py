@@ -1,6 +1,18 @@
-from django.test import TestCase
+import os
+import tempfile
+from io import StringIO
 
-from ..models import Group, Post, User, CONSTRAINT_VARIABLE
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, skipUnlessDBFeature
+
+from ..contstants import FEED_ORDERING, TIMELINE_ORDERING
+from ..models import (
+    Comment, Follow, Group, Post, TimelineEntry, User, UserStats,
+    CONSTRAINT_VARIABLE,
+)
+from ..search import search_post_ids
+from ..utils import CursorPaginator, feed_queryset
 
 
 class PostModelTest(TestCase):
@@ -29,3 +41,266 @@ class PostModelTest(TestCase):
                 self.assertEqual(str(correct_option), expected_values,
                                  'Ошибка метода _str__ в'
                                  f'модели {type(correct_option).__name__}')
+
+
+class CountersTest(TestCase):
+    """Денормализованные счётчики постов, комментариев и подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_signals_maintain_counters(self):
+        """Сигналы увеличивают и уменьшают счётчики."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_new_user_gets_stats_row(self):
+        """Строка счётчиков заводится при создании пользователя."""
+        user = User.objects.create_user(username='newcomer')
+        self.assertTrue(UserStats.objects.filter(user=user).exists())
+
+    def test_for_user_does_not_write(self):
+        """Без строки счётчики читаются как нули, строка не создаётся."""
+        UserStats.objects.filter(user=self.reader).delete()
+        with self.assertNumQueries(1):
+            stats = UserStats.for_user(self.reader)
+        self.assertEqual(stats.following_count, 0)
+        self.assertFalse(UserStats.objects.filter(user=self.reader).exists())
+
+    def test_reconcile_counters_repairs_drift(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ком')
+        Post.objects.filter(pk=post.pk).update(comments_count=42)
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.assertIn('Исправлено постов: 1', out.getvalue())
+
+
+class DataTransferTest(TestCase):
+    """Массовая выгрузка и загрузка данных."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+
+    def setUp(self):
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост про штрудель'
+        )
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def wipe(self):
+        for model in (Follow, Comment, Post, Group, UserStats):
+            model.objects.all().delete()
+        User.objects.filter(username='reader').delete()
+
+    def test_jsonl_round_trip(self):
+        """Данные возвращаются вместе со счётчиками, лентами и индексом."""
+        pub_date = Post.objects.get(pk=self.post.pk).pub_date
+        created = Comment.objects.get().created
+        call_command(
+            'export_data', output=self.path, stderr=StringIO()
+        )
+        self.wipe()
+
+        out = StringIO()
+        call_command(
+            'import_data', self.path, batch_size=1, stdout=out,
+            stderr=StringIO(),
+        )
+
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.pub_date, pub_date)
+        self.assertEqual(post.group, Group.objects.get(slug='group'))
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().created, created)
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertEqual(UserStats.for_user(reader).following_count, 1)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=post).exists()
+        )
+        if connection.vendor == 'sqlite':
+            self.assertEqual(search_post_ids('штрудель', 10), [post.pk])
+        self.assertIn('post: 1', out.getvalue())
+
+    def test_refuses_non_empty_tables(self):
+        """id из дампа не смешиваются с уже загруженными строками."""
+        call_command('export_data', output=self.path, stderr=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command('import_data', self.path, stdout=StringIO(),
+                         stderr=StringIO())
+
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_existing_follows_are_not_counted(self):
+        """Уже сохранённые и повторные подписки не попадают в итог."""
+        with open(self.path, 'w', encoding='utf-8') as stream:
+            for username in ('reader', 'reader', 'newcomer'):
+                stream.write(
+                    '{"model": "follow", "user": "%s", '
+                    '"author": "author"}\n' % username
+                )
+        out = StringIO()
+
+        call_command('import_data', self.path, stdout=out, stderr=StringIO())
+
+        self.assertIn('follow: 1', out.getvalue())
+        self.assertEqual(UserStats.for_user(self.author).followers_count, 2)
+
+    def test_csv_single_model(self):
+        """csv выгружается по одной модели и загружается с --model."""
+        path = self.path.replace('.jsonl', '.csv')
+        self.addCleanup(os.remove, path)
+        call_command(
+            'export_data', models=['group'], format='csv', output=path,
+            stderr=StringIO(),
+        )
+        with open(path, encoding='utf-8') as stream:
+            self.assertEqual(
+                stream.readline().strip(), 'id,title,slug,description'
+            )
+        self.wipe()
+
+        call_command(
+            'import_data', path, model='group', stdout=StringIO(),
+            stderr=StringIO(),
+        )
+
+        self.assertEqual(Group.objects.get(pk=self.group.pk).slug, 'group')
+
+    def test_default_batch_size(self):
+        """Пачка по умолчанию больше предела SQLite на один INSERT."""
+        with open(self.path, 'w', encoding='utf-8') as stream:
+            for number in range(600):
+                stream.write(
+                    '{"model": "follow", "user": "reader%d", '
+                    '"author": "author"}\n' % number
+                )
+
+        call_command('import_data', self.path, stdout=StringIO(),
+                     stderr=StringIO())
+
+        self.assertEqual(
+            Follow.objects.filter(author=self.author).count(), 601
+        )
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class IndexUsageTest(TestCase):
+    """Запросы лент не должны сканировать таблицы целиком."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            group=cls.group,
+            text='Тестовый пост',
+        )
+        TimelineEntry.objects.create(
+            user=cls.user,
+            post=cls.post,
+            author=cls.user,
+            pub_date=cls.post.pub_date,
+        )
+
+    def full_scans(self, queryset):
+        """Возвращает строки плана с полным сканированием таблицы."""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        return [
+            line for line in plan
+            if line.startswith('SCAN') and 'USING' not in line
+        ]
+
+    def feed_page(self, queryset, ordering=FEED_ORDERING):
+        """Первая и следующая по курсору страницы ленты."""
+        paginator = CursorPaginator(queryset, 10, ordering)
+        values = paginator._key(queryset.order_by(*ordering)[0])
+        return (
+            queryset.order_by(*ordering)[:11],
+            queryset.filter(paginator._after(values))
+            .order_by(*ordering)[:11],
+        )
+
+    def test_feed_queries_use_indexes(self):
+        """Каждая форма запроса из posts/views.py идёт по индексу."""
+        queries = {
+            'index': self.feed_page(feed_queryset(Post.objects.all())),
+            'group': self.feed_page(
+                feed_queryset(self.group.posts.all())
+            ),
+            'profile': self.feed_page(
+                feed_queryset(self.user.posts.all())
+            ),
+            'follow': self.feed_page(
+                TimelineEntry.objects.filter(user=self.user),
+                TIMELINE_ORDERING,
+            ),
+            'comments': (self.post.comments.all(),),
+            'following': (
+                Follow.objects.filter(user=self.user, author=self.user),
+            ),
+            'followers': (Follow.objects.filter(author=self.user),),
+            'comment_count': (Comment.objects.filter(post=self.post),),
+        }
+        for name, querysets in queries.items():
+            for queryset in querysets:
+                with self.subTest(name=name, sql=str(queryset.query)):
+                    self.assertEqual(self.full_scans(queryset), [])
@@ -1,13 +1,43 @@
+import time
+from datetime import timedelta
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
 
-from ..models import Group, Post, Follow, User, Comment
-from ..contstants import VARIABLE_POSTS, COUNT_POSTS_LIMIT, NAME_USERS
+from .. import ranking, recommendations
+from ..benchmark import compare, generate, measure, scenarios
+from ..caching import (
+    FEED_SCOPE, RANKING_SCOPE, generations, invalidate_post, reset_stats,
+)
+from ..counts import cached_count, estimated_count
+from ..models import (
+    Group, Post, PostRanking, Follow, FollowSuggestion, User, Comment,
+    TimelineEntry,
+)
+from ..contstants import (
+    COMMENTS_PER_PAGE, COUNT_STALENESS, VARIABLE_POSTS, COUNT_POSTS_LIMIT,
+    NAME_USERS, RANKING_VELOCITY_HALF_LIFE_HOURS, TIMELINE_CELEBRITY_FOLLOWERS,
+)
+
+
+def run_on_commit():
+    """Выполняет колбэки on_commit, отложенные транзакцией теста.
+
+    TestCase не коммитит, поэтому сброс кеша из сигналов вызывается
+    вручную, как ``captureOnCommitCallbacks(execute=True)``.
+    """
+    callbacks, connection.run_on_commit = connection.run_on_commit, []
+    for _, callback in callbacks:
+        callback()
 
 
 class StaticURLTests(TestCase):
@@ -232,24 +262,97 @@ class StaticURLTests(TestCase):
         self.assertNotIn(self.post, response.context['page_obj'])
 
     def test_cach_in_index_page(self):
-        """Проверяем кеширование главной страницы."""
+        """Проверяем кеширование карточек постов на главной странице."""
         response = self.authorized_client.get(reverse('posts:index'))
-        with_cache = response.content
-        Post.objects.all().delete()
+        self.assertContains(response, self.post.text)
+
+        Post.objects.filter(pk=self.post.pk).update(text='Изменённый текст')
         response = self.authorized_client.get(reverse('posts:index'))
-        after_clearing_the_cache = response.content
-        self.assertEqual(
-            with_cache,
-            after_clearing_the_cache
-        )
+        self.assertContains(response, self.post.text)
 
-        cache.clear()
+        invalidate_post(self.post)
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertContains(response, 'Изменённый текст')
 
+    def test_cached_cards_keep_user_chrome_fresh(self):
+        """Шапка страницы не попадает в кеш вместе с карточками."""
         response = self.authorized_client.get(reverse('posts:index'))
-        response_without_post_and_cache = response.content
-        self.assertNotEqual(
-            with_cache, response_without_post_and_cache
+        self.assertContains(response, f'Пользователь: {self.user.username}')
+
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.text)
+        self.assertNotContains(response, 'Пользователь:')
+
+    def test_comment_invalidates_cached_card(self):
+        """Новый комментарий обновляет закешированную карточку."""
+        url = reverse('posts:index')
+        self.assertContains(self.client.get(url), 'Комментариев: 1')
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data={'text': 'Ещё комментарий'},
+        )
+        run_on_commit()
+        self.assertContains(self.client.get(url), 'Комментариев: 2')
+
+    def test_post_delete_skips_comment_cascade(self):
+        """Удаление поста не сбрасывает его кеш по разу на комментарий."""
+        post = Post.objects.create(text='Обсуждаемый', author=self.author)
+        for i in range(3):
+            Comment.objects.create(post=post, author=self.user, text=str(i))
+        with mock.patch('posts.signals._invalidate_on_commit') as invalidate:
+            post.delete()
+        invalidate.assert_called_once()
+        self.assertFalse(Comment.objects.filter(post_id=post.id).exists())
+
+    def test_feed_pages_invalidated_by_writes(self):
+        """Записи сдвигают поколения лент, и страницы сразу обновляются."""
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
+        for url in pages:
+            self.client.get(url)
+        new_post = Post.objects.create(
+            text='Свежий пост', group=self.group, author=self.author
         )
+        run_on_commit()
+        for url in pages:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url).context['page_obj'][0], new_post
+                )
+
+        new_post.group = self.another_group
+        new_post.save()
+        run_on_commit()
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        )
+        self.assertNotIn(new_post, response.context['page_obj'])
+
+    def test_writes_invalidate_after_commit(self):
+        """До коммита поколение прежнее: страница, прочитанная внутри
+        транзакции, не попадает в кеш под новым поколением."""
+        url = reverse('posts:index')
+        before = generations([FEED_SCOPE])
+        Post.objects.create(text='Незакоммиченный', author=self.author)
+        self.assertEqual(generations([FEED_SCOPE]), before)
+        self.client.get(url)
+        run_on_commit()
+        self.assertNotEqual(generations([FEED_SCOPE]), before)
+        self.assertContains(self.client.get(url), 'Незакоммиченный')
+
+    def test_cache_stats_command(self):
+        """Команда cache_stats выводит попадания и промахи."""
+        # Часть счётчиков копится в процессе и не сбрасывается с кешем.
+        reset_stats()
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        out = StringIO()
+        call_command('cache_stats', '--reset', stdout=out)
+        self.assertIn('Попаданий: 1', out.getvalue())
+        self.assertIn('Промахов: 1', out.getvalue())
 
 
 class PaginatorViewsTest(TestCase):
@@ -339,6 +442,402 @@ class PaginatorViewsTest(TestCase):
                         COUNT_POSTS_LIMIT,
                     )
 
+    def test_invalid_page_number_shows_first_page(self):
+        """Нечисловой или огромный ?page= не роняет ленту."""
+        url = reverse('posts:index')
+        for page in ('²', 'abc', '-1', '0', str(10 ** 30)):
+            with self.subTest(page=page):
+                response = self.client.get(url, {'page': page})
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_cursor_navigation(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_page = self.client.get(url).context['page_obj']
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), COUNT_POSTS_LIMIT)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(
+            set(first_page).isdisjoint(set(second_page))
+        )
+
+        back_page = self.client.get(
+            url, {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_total_count_served_from_cache(self):
+        """Общее число записей не пересчитывается на каждой странице."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        total = VARIABLE_POSTS + COUNT_POSTS_LIMIT
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'].count, total)
+        self.assertContains(response, f'Всего записей: {total}')
+
+        group_posts = self.group.posts.all()
+        cached_count(group_posts, 'test')
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(group_posts, 'test'), total)
+
+    def test_stale_estimate_does_not_hide_pages(self):
+        """?page=N не урезается до заниженной оценки общего числа."""
+        cache.set('posts:estimate:feed', (1, time.time()), None)
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertEqual(len(response.context['page_obj']), COUNT_POSTS_LIMIT)
+
+    def test_page_past_the_end_shows_last_page(self):
+        """Номер за концом ленты ведёт на последнюю страницу."""
+        response = self.client.get(reverse('posts:index'), {'page': 99})
+        self.assertEqual(len(response.context['page_obj']), COUNT_POSTS_LIMIT)
+
+    def test_estimated_count_staleness_is_bounded(self):
+        """Точное число старше COUNT_STALENESS пересчитывается."""
+        posts = Post.objects.all()
+        cache.set(
+            'posts:estimate:test', (1, time.time() - COUNT_STALENESS - 1),
+            None,
+        )
+        self.assertEqual(
+            estimated_count(posts, 'test'), VARIABLE_POSTS + COUNT_POSTS_LIMIT
+        )
+        with self.assertNumQueries(0):
+            estimated_count(posts, 'test')
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор отдаёт первую страницу."""
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.context['page_obj']), VARIABLE_POSTS)
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов ленты не зависит от числа карточек."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='feed-slug',
+            description='Тестовое описание',
+        )
+        for i in range(VARIABLE_POSTS):
+            author = User.objects.create_user(
+                username=f'author_{i}', first_name='Имя', last_name=str(i)
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                author=author, group=cls.group, text=f'Пост {i}'
+            )
+            Comment.objects.create(post=post, author=author, text='Ком')
+            TimelineEntry.objects.create(
+                user=cls.reader,
+                post=post,
+                author=author,
+                pub_date=post.pub_date,
+            )
+        cls.author = author
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def test_feed_pages_use_fixed_number_of_queries(self):
+        """Страница ленты укладывается в фиксированное число запросов."""
+        pages = (
+            (self.client, reverse('posts:index'), 1),
+            (
+                self.client,
+                reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+                2,
+            ),
+            (
+                self.client,
+                reverse('posts:profile', kwargs={'username': self.author}),
+                3,
+            ),
+            (self.reader_client, reverse('posts:follow_index'), 6),
+        )
+        for client, url, queries in pages:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertContains(response, 'Комментариев: 1')
+
+    def test_api_feeds_use_fixed_number_of_queries(self):
+        """JSON-ленты строятся тем же числом запросов без моделей."""
+        pages = (
+            (self.client, reverse('posts:api_index'), 1, VARIABLE_POSTS),
+            (
+                self.client,
+                reverse(
+                    'posts:api_group_list', kwargs={'slug': self.group.slug}
+                ),
+                2,
+                VARIABLE_POSTS,
+            ),
+            (
+                self.client,
+                reverse(
+                    'posts:api_profile', kwargs={'username': self.author}
+                ),
+                3,
+                1,
+            ),
+            (self.reader_client, reverse('posts:api_follow_index'), 5,
+             VARIABLE_POSTS),
+        )
+        for client, url, queries, length in pages:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                results = response.json()['results']
+                self.assertEqual(len(results), length)
+                self.assertEqual(results[0]['comments_count'], 1)
+                self.assertEqual(results[0]['group'], self.group.slug)
+
+    def test_api_fields_and_cursor(self):
+        """Клиент выбирает поля и листает ленту курсором."""
+        Post.objects.create(author=self.author, text='Новый пост')
+        url = reverse('posts:api_index')
+        data = self.client.get(url, {'fields': 'id,text'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertEqual(data['results'][0]['text'], 'Новый пост')
+        self.assertEqual(data['count'], VARIABLE_POSTS + 1)
+        data = self.client.get(
+            url, {'fields': 'author', 'cursor': data['next']}
+        ).json()
+        self.assertEqual(data['results'], [{'author': 'author_0'}])
+        self.assertIsNone(data['next'])
+        response = self.client.get(url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_api_follow_index_requires_login(self):
+        """Аноним получает ошибку в JSON, а не страницу входа."""
+        response = self.client.get(reverse('posts:api_follow_index'))
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        self.assertIn('error', response.json())
+
+
+class BenchmarkTest(TestCase):
+    """Генератор данных и замеры нагрузочного теста."""
+
+    def test_generate_and_measure(self):
+        """Сценарии отвечают 200, замер содержит все метрики."""
+        objects = generate(posts=30, users=6, comments_per_post=3)
+        self.assertEqual(Post.objects.count(), 30)
+        dates = Post.objects.order_by('pub_date').values_list(
+            'pub_date', flat=True
+        )
+        self.assertEqual(dates.last() - dates.first(), timedelta(minutes=29))
+        self.assertEqual(Comment.objects.count(), 90)
+        self.assertTrue(Follow.objects.exists())
+        for name, url, user in scenarios(objects):
+            with self.subTest(name=name):
+                result = measure(url, user, requests=2)
+                self.assertGreater(result['queries'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_compare_reports_regressions(self):
+        """Рост числа запросов или времени выше допуска — регрессия."""
+        baseline = {'100': {'index': {
+            'queries': 3, 'p50_ms': 10, 'p99_ms': 20, 'peak_kb': 100,
+        }}}
+        results = {'100': {'index': {
+            'queries': 4, 'p50_ms': 11, 'p99_ms': 40, 'peak_kb': 100,
+        }}}
+        regressions = compare(results, baseline, tolerance=0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('запросов 3 → 4', regressions[0])
+        self.assertIn('p99_ms', regressions[1])
+
+
+class CommentsPaginationTest(TestCase):
+    """Комментарии поста выдаются порциями."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        for i in range(COMMENTS_PER_PAGE + COUNT_POSTS_LIMIT):
+            commentator = User.objects.create_user(username=f'user_{i}')
+            Comment.objects.create(
+                post=cls.post, author=commentator, text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_detail_renders_first_chunk(self):
+        """Страница поста выводит только первую порцию комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertContains(response, 'Показать ещё')
+
+    def test_post_detail_query_count_is_bounded(self):
+        """Авторы комментариев загружаются вместе с комментариями."""
+        with self.assertNumQueries(3):
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+            )
+
+    def test_next_chunks_endpoint(self):
+        """Эндпоинт отдаёт следующие порции в HTML и JSON."""
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+        first = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(len(first['comments']), COMMENTS_PER_PAGE)
+
+        response = self.client.get(url, {'cursor': first['next']})
+        self.assertTemplateUsed(response, 'posts/includes/comments_list.html')
+        self.assertEqual(len(response.context['comments']), COUNT_POSTS_LIMIT)
+        self.assertNotContains(response, 'Показать ещё')
+
+        last = self.client.get(
+            url, {'cursor': first['next'], 'format': 'json'}
+        ).json()
+        self.assertIsNone(last['next'])
+        self.assertEqual(
+            last['comments'][-1]['text'],
+            f'Комментарий {COMMENTS_PER_PAGE + COUNT_POSTS_LIMIT - 1}',
+        )
+
+
+class ConditionalGetTest(TestCase):
+    """Неизменившиеся страницы отдаются ответом 304."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='etag-slug', description='Описание'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост'
+        )
+        run_on_commit()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_unchanged_pages_return_not_modified(self):
+        """Повторный запрос с ETag не строит страницу."""
+        pages = (
+            (reverse('posts:index'), 0),
+            (reverse('posts:group_list', args=[self.group.slug]), 1),
+            (reverse('posts:profile', args=[self.author.username]), 1),
+            (reverse('posts:post_detail', args=[self.post.pk]), 1),
+        )
+        for url, queries in pages:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(queries):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+
+    def test_changes_and_users_change_etag(self):
+        """Новый комментарий и другой пользователь дают другой ETag."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.author_client.get(url)['ETag'], etag)
+
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Новый комментарий'
+        )
+        run_on_commit()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_evicted_generation_does_not_revive_etag(self):
+        """Поколение, пропавшее из кеша, не совпадает со старым."""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='Ещё пост')
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class SearchViewsTest(TestCase):
+    """Полнотекстовый поиск по постам и комментариям."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Рецепт вишнёвого пирога'
+        )
+        cls.other_post = Post.objects.create(
+            author=cls.author, text='Заметки о погоде'
+        )
+        Comment.objects.create(
+            post=cls.other_post, author=cls.author, text='А пирог будет?'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_search_by_post_and_comment_text(self):
+        """Находятся посты по своему тексту и по тексту комментариев."""
+        self.assertEqual(self.search('вишнёвого'), [self.post])
+        self.assertEqual(self.search('погод'), [self.other_post])
+        self.assertCountEqual(
+            self.search('пирог'), [self.post, self.other_post]
+        )
+
+    def test_index_follows_writes(self):
+        """Индекс обновляется при изменении и удалении."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Рецепт яблочного штруделя'
+        post.save()
+        self.assertEqual(self.search('вишнёвого'), [])
+        self.assertEqual(self.search('штруделя'), [post])
+
+        post.delete()
+        self.assertEqual(self.search('штруделя'), [])
+
+    def test_query_syntax_is_escaped(self):
+        """Служебные символы FTS5 в запросе не ломают поиск."""
+        response = self.client.get(
+            reverse('posts:search'), {'q': '"пирог" OR (NEAR'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_invalid_page_number(self):
+        """Нечисловой ?page= показывает первую страницу результатов."""
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'пирог', 'page': '²'}
+        )
+        self.assertEqual(response.context['page_number'], 1)
+        self.assertEqual(len(response.context['page_obj']), 2)
+
 
 class FollowViewsTest(TestCase):
     """Класс тестирования подписок."""
@@ -423,3 +922,289 @@ class FollowViewsTest(TestCase):
         ))
 
         self.assertEqual(len(count_follow), 1)
+
+    def test_follow_index_shows_followed_authors_posts(self):
+        """Лента подписок заполняется при подписке и при новом посте."""
+        old_post = Post.objects.create(author=self.author, text='Старый пост')
+        self.user_client.post(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Новый пост'}
+        )
+        new_post = Post.objects.get(text='Новый пост')
+
+        response = self.user_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, old_post]
+        )
+
+        response = self.author_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_unfollow_prunes_timeline(self):
+        """После отписки посты автора пропадают из ленты."""
+        Post.objects.create(author=self.author, text='Пост')
+        self.user_client.post(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        self.user_client.post(
+            reverse('posts:profile_unfollow', kwargs={'username': self.author})
+        )
+
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+        response = self.user_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def make_celebrity(self):
+        """Делает автора «звездой»; пользователь тоже подписан."""
+        User.objects.bulk_create(
+            User(username=f'fan_{i}')
+            for i in range(TIMELINE_CELEBRITY_FOLLOWERS - 1)
+        )
+        fans = User.objects.filter(username__startswith='fan_')
+        Follow.objects.bulk_create(
+            Follow(user=fan, author=self.author) for fan in fans
+        )
+        # bulk_create минует сигналы счётчиков.
+        call_command('reconcile_counters', stdout=StringIO())
+        Follow.objects.create(user=self.user, author=self.author)
+
+    def test_celebrity_posts_are_pulled_on_read(self):
+        """Посты авторов с большим числом подписчиков подмешиваются
+        в ленту при чтении, а не рассылаются при публикации."""
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Обычный пост')
+        self.user_client.post(
+            reverse('posts:profile_follow', kwargs={'username': other})
+        )
+        self.make_celebrity()
+        self.author_client.post(
+            reverse('posts:post_create'), data={'text': 'Звёздный пост'}
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.user, author=self.author
+        ).exists())
+        entries = TimelineEntry.objects.count()
+
+        response = self.user_client.get(reverse('posts:follow_index'))
+
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Звёздный пост', 'Обычный пост'],
+        )
+        self.assertEqual(TimelineEntry.objects.count(), entries)
+
+    def test_celebrity_feed_pages(self):
+        """Смешанная лента листается курсором и старыми номерами."""
+        self.make_celebrity()
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}')
+            for i in range(VARIABLE_POSTS + 1)
+        )
+        url = reverse('posts:follow_index')
+        first = self.user_client.get(url).context['page_obj']
+        self.assertEqual(len(first), VARIABLE_POSTS)
+        second = self.user_client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second), 1)
+        for number in (2, 99):
+            with self.subTest(page=number):
+                response = self.user_client.get(url, {'page': number})
+                self.assertEqual(
+                    list(response.context['page_obj']), list(second)
+                )
+
+    @override_settings(BACKGROUND_TASKS_SYNC=True)
+    def test_author_below_threshold_is_backfilled(self):
+        """Бывшая «звезда» дописывает свои посты в ленты подписчиков."""
+        self.make_celebrity()
+        post = Post.objects.create(author=self.author, text='Звёздный пост')
+        TimelineEntry.objects.filter(post=post).delete()
+        Follow.objects.filter(
+            author=self.author, user__username='fan_0'
+        ).delete()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+
+class RankingTest(TestCase):
+    """Лента «Популярное» по материализованному рейтингу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.star = User.objects.create_user(username='star')
+        cls.writer = User.objects.create_user(username='writer')
+        for i in range(3):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'fan_{i}'),
+                author=cls.star,
+            )
+        now = timezone.now()
+
+        def post(author, text, hours):
+            post = Post.objects.create(author=author, text=text)
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(hours=hours)
+            )
+            return post
+
+        cls.fresh = post(cls.writer, 'Свежий', 0)
+        cls.discussed = post(cls.writer, 'Обсуждаемый', 3)
+        cls.popular = post(cls.star, 'Популярный автор', 1)
+        cls.old = post(cls.star, 'Старый', 24 * 10)
+        for _ in range(5):
+            Comment.objects.create(
+                post=cls.discussed, author=cls.star, text='Ком'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ranked_page_order(self):
+        """Комментарии и подписчики поднимают пост, старые не попадают."""
+        call_command('refresh_ranking', stdout=StringIO())
+        response = self.client.get(reverse('posts:top'))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [self.discussed, self.popular, self.fresh],
+        )
+
+    def test_velocity_is_refreshed_incrementally(self):
+        """Скорость затухает между пересчётами и растёт от комментариев."""
+        now = timezone.now()
+        ranking.refresh(now)
+        velocity = PostRanking.objects.get(
+            post=self.discussed).comment_velocity
+        self.assertAlmostEqual(velocity, 5, places=2)
+        later = now + timedelta(hours=RANKING_VELOCITY_HALF_LIFE_HOURS)
+        ranking.refresh(later)
+        self.assertAlmostEqual(
+            PostRanking.objects.get(post=self.discussed).comment_velocity,
+            velocity / 2, places=2,
+        )
+        comment = Comment.objects.create(
+            post=self.discussed, author=self.star, text='+'
+        )
+        Comment.objects.filter(pk=comment.pk).update(
+            created=later + timedelta(minutes=1)
+        )
+        ranking.refresh(later + timedelta(minutes=1))
+        self.assertAlmostEqual(
+            PostRanking.objects.get(post=self.discussed).comment_velocity,
+            velocity / 2 + 1, places=1,
+        )
+
+    def test_refresh_bumps_cache_after_commit(self):
+        """Пока транзакция не закоммичена, поколение рейтинга прежнее."""
+        before = generations([RANKING_SCOPE])
+        ranking.refresh()
+        self.assertEqual(generations([RANKING_SCOPE]), before)
+
+    @override_settings(FEED_RANKER='posts.tests.test_views.FollowersRanker')
+    def test_ranker_is_pluggable(self):
+        ranking.refresh()
+        self.assertEqual(
+            PostRanking.objects.order_by('-score').first().post,
+            self.popular,
+        )
+
+
+class FollowersRanker:
+    """Ранжировщик для теста подмены: учитывает только подписчиков."""
+
+    def score(self, features):
+        return features['followers']
+
+
+class RecommendationsTest(TestCase):
+    """Рекомендации подписок по графу Follow."""
+
+    @classmethod
+    def setUpTestData(cls):
+        names = ('reader', 'first', 'second', 'common', 'neighbour', 'other')
+        cls.users = {
+            name: User.objects.create_user(username=name) for name in names
+        }
+        edges = (
+            ('reader', 'first'), ('reader', 'second'),
+            ('first', 'common'), ('second', 'common'),
+            ('neighbour', 'first'), ('neighbour', 'other'),
+        )
+        for user, author in edges:
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author]
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.users['reader'])
+
+    def test_graph_adjacency(self):
+        graph = recommendations.FollowGraph.load()
+        node = list(graph.ids).index(self.users['first'].id)
+        self.assertEqual(
+            sorted(graph.ids[i] for i in graph.followers(node)),
+            sorted([self.users['reader'].id, self.users['neighbour'].id]),
+        )
+        self.assertEqual(
+            [graph.ids[i] for i in graph.following(node)],
+            [self.users['common'].id],
+        )
+
+    def test_suggestions_are_stored_and_shown(self):
+        """Друзья друзей выше совместных подписок, подписки не советуются."""
+        call_command('build_recommendations', stdout=StringIO())
+        suggested = [
+            suggestion.author for suggestion in FollowSuggestion.objects
+            .filter(user=self.users['reader']).order_by('-score')
+        ]
+        self.assertEqual(
+            suggested, [self.users['common'], self.users['other']]
+        )
+        for url in (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=('first',)),
+        ):
+            with self.subTest(url=url):
+                response = self.reader_client.get(url)
+                self.assertEqual(
+                    [item.author for item in response.context['suggestions']],
+                    suggested,
+                )
+
+    @mock.patch('posts.recommendations.RECOMMENDATIONS_FANOUT_LIMIT', 1)
+    def test_fanout_samples_followers(self):
+        """Подписчики популярного автора выбираются случайно, а не по id."""
+        graph = recommendations.FollowGraph.load()
+        node = list(graph.ids).index(self.users['reader'].id)
+        last = mock.Mock(side_effect=lambda items, k: list(items)[-k:])
+        with mock.patch('posts.recommendations.random.sample', last):
+            suggested = [
+                graph.ids[candidate]
+                for candidate, _ in recommendations.suggest(graph, node)
+            ]
+        last.assert_called()
+        self.assertIn(self.users['other'].id, suggested)
+
+    def test_rebuild_drops_suggestions_without_follows(self):
+        """Рекомендации отписавшегося от всех пользователя удаляются."""
+        recommendations.rebuild(batch_size=1)
+        Follow.objects.filter(user=self.users['reader']).delete()
+        recommendations.rebuild(batch_size=1)
+        self.assertFalse(FollowSuggestion.objects.filter(
+            user=self.users['reader']
+        ).exists())
+        self.assertTrue(FollowSuggestion.objects.exists())
+
+    def test_follow_removes_suggestion(self):
+        recommendations.rebuild()
+        self.reader_client.get(
+            reverse('posts:profile_follow', args=('common',))
+        )
+        self.assertFalse(FollowSuggestion.objects.filter(
+            user=self.users['reader'], author=self.users['common']
+        ).exists())
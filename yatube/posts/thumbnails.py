@@ -0,0 +1,110 @@
+import threading
+
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import background
+from .caching import invalidate_post
+from .contstants import THUMBNAIL_GEOMETRIES
+from .kvstore import image_key
+from .models import Post
+
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет назвать миниатюру, не нарезая её.
+
+    Подключается через THUMBNAIL_BACKEND. Имя вычисляется собственными
+    методами бэкенда, поэтому совпадает с тем, под которым
+    ``get_thumbnail`` сохраняет миниатюру.
+    """
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """ImageFile будущей миниатюры без обращения к хранилищу."""
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return ImageFile(
+            self._get_thumbnail_filename(source, geometry_string, options),
+            default.storage,
+        )
+
+
+def thumbnail_file(file_, geometry, **options):
+    """ImageFile будущей миниатюры без обращения к хранилищу."""
+    return default.backend.thumbnail_file(file_, geometry, **options)
+
+
+def generate_thumbnails(name):
+    """Создаёт все миниатюры из THUMBNAIL_GEOMETRIES для картинки.
+
+    Карточки постов с заглушкой вместо картинки сбрасываются из кеша.
+    """
+    # Исходник берётся через поле, как в шаблонах: ключ sorl учитывает
+    # хранилище файла, а у поля оно может отличаться от THUMBNAIL_STORAGE.
+    image = Post(image=name).image
+    try:
+        for geometry, options in THUMBNAIL_GEOMETRIES:
+            get_thumbnail(image, geometry, **options)
+        posts = Post.objects.filter(image=name).only('id', 'author', 'group')
+        for post in posts:
+            invalidate_post(post)
+    finally:
+        with _pending_lock:
+            _pending.discard(name)
+
+
+def schedule_thumbnails(image):
+    """Отправляет картинку в фоновый пул на нарезку миниатюр.
+
+    Картинка помечается ожидающей только после коммита, вместе
+    с отправкой задачи: при откате транзакции пометка не остаётся.
+    """
+    if image:
+        background.after_commit(_submit, image.name)
+
+
+def _submit(name):
+    with _pending_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    background.submit(generate_thumbnails, name)
+
+
+def prefetch_thumbnails(posts):
+    """Одним запросом загружает метаданные миниатюр для постов страницы."""
+    load_many = getattr(default.kvstore, 'load_many', None)
+    if load_many is None:
+        return posts
+    load_many([
+        image_key(thumbnail_file(post.image, geometry, **options))
+        for post in posts if post.image
+        for geometry, options in THUMBNAIL_GEOMETRIES
+    ])
+    return posts
+
+
+def ready_thumbnail(image, geometry, **options):
+    """Готовая миниатюра или None, если она ещё не создана.
+
+    Отсутствующая миниатюра не нарезается во время рендера,
+    а ставится в очередь фонового пула.
+    """
+    if not image:
+        return None
+    cached = default.kvstore.get(thumbnail_file(image, geometry, **options))
+    if cached is None:
+        schedule_thumbnails(image)
+    return cached
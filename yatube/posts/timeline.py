@@ -0,0 +1,208 @@
+from django.db.models import F
+
+from core import background
+from .contstants import (
+    TIMELINE_BACKFILL_LIMIT,
+    TIMELINE_BATCH_SIZE,
+    TIMELINE_CELEBRITY_FOLLOWERS,
+    TIMELINE_ORDERING,
+    VARIABLE_POSTS,
+)
+from .models import Follow, Post, TimelineEntry, User, UserStats
+from .utils import (
+    MergedCursorPaginator, feed_queryset, imitation_of_page,
+    page_from_request,
+)
+
+
+def is_celebrity(author):
+    """Автор, чьи посты не рассылаются, а подтягиваются при чтении."""
+    return (
+        UserStats.for_user(author).followers_count
+        >= TIMELINE_CELEBRITY_FOLLOWERS
+    )
+
+
+def _entries(user_id, posts):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for post in posts
+    ]
+
+
+def fan_out_post(post):
+    """Рассылает новый пост по лентам подписчиков автора."""
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)[:TIMELINE_CELEBRITY_FOLLOWERS]
+    )
+    if len(followers) >= TIMELINE_CELEBRITY_FOLLOWERS:
+        return
+    entries = []
+    for user_id in followers:
+        entries.extend(_entries(user_id, [post]))
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=TIMELINE_BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def backfill(user, author, since=None):
+    """Добавляет в ленту пользователя последние посты автора."""
+    posts = Post.objects.filter(author=author).only(
+        'id', 'author_id', 'pub_date'
+    )
+    if since is not None:
+        posts = posts.filter(pub_date__gt=since)
+    posts = posts.order_by('-pub_date')[:TIMELINE_BACKFILL_LIMIT]
+    TimelineEntry.objects.bulk_create(
+        _entries(user.id, posts),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def follow(user, author):
+    """Заполняет ленту при подписке, если автор не из «звёзд»."""
+    if not is_celebrity(author):
+        backfill(user, author)
+
+
+def unfollow(user, author):
+    """Убирает посты автора из ленты пользователя."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def backfill_author(author_id):
+    """Дописывает последние посты автора в ленты всех его подписчиков.
+
+    Нужна, когда автор опускается ниже порога «звёзд»: посты, которые
+    он публиковал «звездой», не рассылались, а при чтении больше
+    не подмешиваются.
+    """
+    posts = list(
+        Post.objects.filter(author_id=author_id)
+        .only('id', 'author_id', 'pub_date')
+        .order_by('-pub_date')[:TIMELINE_BACKFILL_LIMIT]
+    )
+    if not posts:
+        return
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+    for user_id in followers.iterator():
+        TimelineEntry.objects.bulk_create(
+            _entries(user_id, posts),
+            batch_size=TIMELINE_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def follower_lost(author_id):
+    """Автор опустился ниже порога «звёзд» — ленты его подписчиков
+    дозаполняются в фоне.
+
+    Переход вверх ничего не требует: с этого момента посты автора
+    подмешиваются при чтении, а уже разосланные записи не мешают.
+    """
+    followers = UserStats.for_user(author_id).followers_count
+    if followers == TIMELINE_CELEBRITY_FOLLOWERS - 1:
+        background.submit(backfill_author, author_id)
+
+
+def entries_page(request, user):
+    """Страница ленты подписок: строки ``{'pub_date', 'post_id'}``.
+
+    Для авторов с большим числом подписчиков рассылка при записи
+    не выполняется: их посты подмешиваются при чтении одним запросом
+    ``author__in`` через UNION с записями ленты, без записи в базу.
+    """
+    entries = TimelineEntry.objects.filter(user=user).values(
+        'pub_date', 'post_id'
+    )
+    celebrities = list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gte=TIMELINE_CELEBRITY_FOLLOWERS,
+        ).values_list('author_id', flat=True)
+    )
+    if not celebrities:
+        return imitation_of_page(request, entries, TIMELINE_ORDERING)
+    pulled = Post.objects.filter(author__in=celebrities).annotate(
+        post_id=F('id')
+    ).values('pub_date', 'post_id')
+    return page_from_request(request, MergedCursorPaginator(
+        [entries, pulled], VARIABLE_POSTS, TIMELINE_ORDERING
+    ))
+
+
+def timeline_page(request, user):
+    """Страница ленты подписок с карточками постов."""
+    page_obj = entries_page(request, user)
+    posts = feed_queryset(Post.objects).in_bulk(
+        [row['post_id'] for row in page_obj.object_list]
+    )
+    page_obj.object_list = [
+        posts[row['post_id']]
+        for row in page_obj.object_list
+        if row['post_id'] in posts
+    ]
+    return page_obj
+
+
+def _celebrities(author_ids):
+    return set(
+        UserStats.objects.filter(
+            user_id__in=author_ids,
+            followers_count__gte=TIMELINE_CELEBRITY_FOLLOWERS,
+        ).values_list('user_id', flat=True)
+    )
+
+
+def fan_out_posts(posts):
+    """Рассылает пачку постов подписчикам, минуя сигналы.
+
+    Нужна после массовой загрузки постов; подписчики всех авторов
+    пачки читаются одним запросом.
+    """
+    authors = {post.author_id for post in posts}
+    authors -= _celebrities(authors)
+    followers = {}
+    for user_id, author_id in Follow.objects.filter(
+            author_id__in=authors).values_list('user_id', 'author_id'):
+        followers.setdefault(author_id, []).append(user_id)
+    TimelineEntry.objects.bulk_create(
+        [
+            entry
+            for post in posts
+            for user_id in followers.get(post.author_id, ())
+            for entry in _entries(user_id, [post])
+        ],
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_follows(follows):
+    """Заполняет ленты по пачке подписок, минуя сигналы."""
+    celebrities = _celebrities({follow.author_id for follow in follows})
+    for follow in follows:
+        if follow.author_id not in celebrities:
+            backfill(User(pk=follow.user_id), follow.author_id)
+
+
+def rebuild_timelines(batch_size):
+    """Заполняет ленты по всем подпискам, минуя сигналы.
+
+    Нужна после массовой загрузки: bulk_create не вызывает рассылку.
+    Уже существующие записи ленты пропускаются.
+    """
+    follows = Follow.objects.exclude(
+        author__stats__followers_count__gte=TIMELINE_CELEBRITY_FOLLOWERS
+    ).select_related('user', 'author')
+    for follow in follows.iterator(chunk_size=batch_size):
+        backfill(follow.user, follow.author)
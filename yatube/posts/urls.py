@@ -1,17 +1,24 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('top/', views.top_index, name='top'),
+    path('search/', views.search, name='search'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path(
         'posts/<int:post_id>/comment/', views.add_comment, name='add_comment'
     ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('follow/', views.follow_index, name='follow_index'),
@@ -25,4 +32,10 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/v1/posts/', api.index, name='api_index'),
+    path('api/v1/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path(
+        'api/v1/profile/<str:username>/', api.profile, name='api_profile'
+    ),
+    path('api/v1/follow/', api.follow_index, name='api_follow_index'),
 ]
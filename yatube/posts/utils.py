@@ -1,12 +1,317 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+import math
 
-from .contstants import VARIABLE_POSTS
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections, router
+from django.db.models import Q
 
+from .contstants import (
+    COMMENT_ORDERING, COMMENTS_PER_PAGE, FEED_FIELDS, FEED_ORDERING,
+    MAX_PAGE_NUMBER, VARIABLE_POSTS,
+)
+from .models import Comment
 
-def imitation_of_page(request, post):
-    """Оптимизированный метод пагинации для views-функции."""
-    paginator = Paginator(post, VARIABLE_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
 
-    return (page_obj)
+def feed_queryset(queryset):
+    """Готовит queryset постов к выводу карточками в ленте.
+
+    Автор и группа подтягиваются одним JOIN, а неиспользуемые колонки
+    не выбираются, чтобы карточка не делала отдельных запросов.
+    Число комментариев берётся из денормализованного ``comments_count``.
+    """
+    return queryset.select_related('author', 'group').only(*FEED_FIELDS)
+
+
+def _encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    raw = json.dumps({'d': direction, 'v': values}, default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(token):
+    """Распаковывает токен курсора. Для битого токена возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, values = data['d'], data['v']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class CursorPage:
+    """Страница keyset-пагинации.
+
+    Повторяет ту часть интерфейса ``django.core.paginator.Page``,
+    которой пользуются шаблоны, но вместо номеров страниц отдаёт
+    токены ``next_cursor`` и ``previous_cursor``.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None,
+                 count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __repr__(self):
+        return f'<CursorPage: {len(self)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинатор по набору полей сортировки.
+
+    Не выполняет ни ``COUNT(*)``, ни ``OFFSET``: следующая страница
+    выбирается условием «строго после последней записи» по ключу
+    ``ordering``, поэтому стоимость запроса не зависит от глубины.
+    Последнее поле ключа должно быть уникальным (обычно ``id``).
+
+    ``count`` — число записей или функция, которая его возвращает
+    (например, из кеша или счётчика); вызывается не больше раза.
+    """
+
+    def __init__(self, queryset, per_page, ordering=FEED_ORDERING,
+                 count=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self._count = count
+
+    @property
+    def count(self):
+        if callable(self._count):
+            self._count = self._count()
+        return self._count
+
+    def _field(self, name):
+        """Находит поле модели по пути вида ``author__username``."""
+        model = self.queryset.model
+        *relations, last = name.split('__')
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(last)
+
+    def _key(self, obj):
+        if isinstance(obj, dict):
+            # Строка из ``values()``.
+            return [obj[name] for name in self.fields]
+        values = []
+        for name in self.fields:
+            value = obj
+            for attr in name.split('__'):
+                value = getattr(value, attr)
+            values.append(value)
+        return values
+
+    def _after(self, values, reverse=False):
+        """Условие «строго после ``values``» в порядке ``ordering``.
+
+        Нестрогая граница по первому полю дублирует условие, но даёт
+        планировщику диапазон для поиска по составному индексу.
+        """
+        condition = Q()
+        for position, name in enumerate(self.ordering):
+            descending = name.startswith('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            field = self.fields[position]
+            step = Q(**{f'{field}__{lookup}': values[position]})
+            for prev_field, prev_value in zip(self.fields, values[:position]):
+                step &= Q(**{prev_field: prev_value})
+            condition |= step
+        first = self.ordering[0]
+        lookup = 'lte' if first.startswith('-') != reverse else 'gte'
+        return Q(**{f'{self.fields[0]}__{lookup}': values[0]}) & condition
+
+    def _parse(self, values):
+        if len(values) != len(self.fields):
+            return None
+        try:
+            return [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (FieldDoesNotExist, ValidationError):
+            return None
+
+    def _make_page(self, rows, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = _encode_cursor('n', self._key(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = _encode_cursor('p', self._key(rows[0]))
+        count = self.count if has_next or has_previous else len(rows)
+        return CursorPage(rows, next_cursor, previous_cursor, count)
+
+    def _ordered(self, condition=None, ordering=None):
+        """Строки после условия ``condition`` в порядке ``ordering``."""
+        queryset = self.queryset
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        return queryset.order_by(*(ordering or self.ordering))
+
+    def first_page(self):
+        rows = list(self._ordered()[:self.per_page + 1])
+        return self._make_page(
+            rows[:self.per_page], len(rows) > self.per_page, False
+        )
+
+    def page_by_number(self, number):
+        """Совместимость со старыми ссылками ``?page=N``.
+
+        Страница выбирается через ``OFFSET``, но без подсчёта общего
+        количества; дальше навигация идёт уже по курсорам. Номер за
+        концом ленты ведёт на последнюю страницу: только в этом случае
+        записи считаются, потому что ``count`` может быть оценкой.
+        """
+        if number <= 1:
+            return self.first_page()
+        rows = self._rows_at(number)
+        if not rows:
+            last = math.ceil(self._ordered().count() / self.per_page)
+            if last <= 1 or last >= number:
+                return self.first_page()
+            number = last
+            rows = self._rows_at(number)
+        return self._make_page(
+            rows[:self.per_page], len(rows) > self.per_page, True
+        )
+
+    def _rows_at(self, number):
+        offset = (number - 1) * self.per_page
+        return list(self._ordered()[offset:offset + self.per_page + 1])
+
+    def get_page(self, cursor=None):
+        decoded = _decode_cursor(cursor) if cursor else None
+        values = decoded and self._parse(decoded[1])
+        if not values:
+            return self.first_page()
+
+        direction = decoded[0]
+        if direction == 'n':
+            rows = list(
+                self._ordered(self._after(values))[:self.per_page + 1]
+            )
+            return self._make_page(
+                rows[:self.per_page], len(rows) > self.per_page, True
+            )
+
+        reverse_ordering = [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+        rows = list(
+            self._ordered(self._after(values, reverse=True), reverse_ordering)
+            [:self.per_page + 1]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        if not has_previous and len(rows) < self.per_page:
+            return self.first_page()
+        return self._make_page(rows, True, has_previous)
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Keyset-пагинатор по объединению нескольких querysets.
+
+    Части выбирают одни и те же колонки ``values()``, среди которых
+    все поля ключа. Условие курсора накладывается на каждую часть,
+    а сортировка и LIMIT — на их UNION, так что страница по-прежнему
+    выбирается одним запросом. Одинаковые строки частей схлопываются.
+    """
+
+    def __init__(self, querysets, per_page, ordering=FEED_ORDERING,
+                 count=None):
+        super().__init__(querysets[0], per_page, ordering, count)
+        self.querysets = querysets
+
+    def _ordered(self, condition=None, ordering=None):
+        # Части без своей сортировки: SQLite не принимает ORDER BY
+        # внутри UNION.
+        parts = [
+            (queryset if condition is None else queryset.filter(condition))
+            .order_by()
+            for queryset in self.querysets
+        ]
+        return parts[0].union(*parts[1:]).order_by(
+            *(ordering or self.ordering)
+        )
+
+
+def parse_page_number(value):
+    """Номер страницы из ``?page=``; не положительное целое — None.
+
+    Как и ``Paginator.get_page``, мусор в параметре не роняет страницу.
+    """
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return min(number, MAX_PAGE_NUMBER) if number > 0 else None
+
+
+def imitation_of_page(request, post, ordering=FEED_ORDERING, count=None):
+    """Оптимизированный метод пагинации для views-функции.
+
+    Страницы адресуются курсором ``?cursor=<token>``; старый параметр
+    ``?page=N`` поддерживается для уже выданных ссылок. Общее число
+    записей берётся из ``count``, а не из ``COUNT(*)``.
+    """
+    return page_from_request(
+        request, CursorPaginator(post, VARIABLE_POSTS, ordering, count)
+    )
+
+
+def page_from_request(request, paginator):
+    """Страница по курсору или номеру из запроса, иначе первая."""
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_page(cursor)
+    page_number = parse_page_number(request.GET.get('page'))
+    if page_number is not None:
+        return paginator.page_by_number(page_number)
+    return paginator.get_page()
+
+
+def comments_page(post_id, cursor=None):
+    """Порция комментариев поста с авторами, загруженными одним JOIN."""
+    comments = (
+        Comment.objects.filter(post_id=post_id)
+        .select_related('author')
+        .only('id', 'text', 'created', 'post_id', 'author__username')
+    )
+    paginator = CursorPaginator(comments, COMMENTS_PER_PAGE, COMMENT_ORDERING)
+    return paginator.get_page(cursor)
+
+
+def insert_batch_size(model, batch_size):
+    """``batch_size`` для bulk_create, урезанный до предела базы.
+
+    Django 2.2 не урезает заданный размер пачки сам, а SQLite принимает
+    не больше 500 строк и 999 параметров в одном INSERT.
+    """
+    connection = connections[router.db_for_write(model)]
+    limit = connection.ops.bulk_batch_size(model._meta.concrete_fields, [])
+    return max(min(batch_size, limit), 1)
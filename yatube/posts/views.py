@@ -1,59 +1,141 @@
 from django.shortcuts import render, get_object_or_404
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
-
-from .utils import imitation_of_page
-from .models import Post, Group, User, Follow
+from django.db import transaction
+from django.http import JsonResponse
+
+from core.db_router import replica_reads
+from core.ratelimit import rate_limit
+
+from . import ranking, recommendations, timeline
+from .conditional import (
+    author_for, conditional_page, group_for, group_scopes, index_scopes,
+    post_detail_scopes, post_for, profile_scopes, top_scopes,
+)
+from .caching import (
+    FEED_SCOPE, attach_card_versions, author_scope, cached_feed_page,
+    group_scope,
+)
+from .contstants import CARD_CACHE_TIMEOUT, VARIABLE_POSTS
+from .counts import cached_count, estimated_count
+from .search import search_post_ids
+from .images import schedule_processing
+from .thumbnails import prefetch_thumbnails
+from .utils import (
+    CursorPage, comments_page, feed_queryset, parse_page_number,
+)
+from .models import Post, User, Follow, UserStats
 from .forms import CommentForm, PostForm
 
 
-@cache_page(20)
+@replica_reads
+@conditional_page(index_scopes)
 def index(request):
     """Функция главной страницы."""
-    post = Post.objects.all()
+    post = feed_queryset(Post.objects.all())
+    page_obj = cached_feed_page(
+        request, post, FEED_SCOPE,
+        count=lambda: estimated_count(Post.objects.all(), FEED_SCOPE),
+    )
     context = {
-        'page_obj': imitation_of_page(request, post),
+        'page_obj': prefetch_thumbnails(page_obj),
+        'card_cache_timeout': CARD_CACHE_TIMEOUT,
     }
 
     return render(request, 'posts/index.html', context)
 
 
+@replica_reads
+@conditional_page(top_scopes)
+def top_index(request):
+    """Лента «Популярное» по рейтингу из ``refresh_ranking``."""
+    page_obj = ranking.ranked_page(request)
+    context = {
+        'page_obj': prefetch_thumbnails(attach_card_versions(page_obj)),
+        'card_cache_timeout': CARD_CACHE_TIMEOUT,
+        'top': True,
+    }
+
+    return render(request, 'posts/index.html', context)
+
+
+@replica_reads
+@conditional_page(group_scopes)
 def group_posts(request, slug):
     """Функция страницы групп."""
-    group = get_object_or_404(Group, slug=slug)
-    post = group.posts.all()
+    group = group_for(request, slug)
+    post = feed_queryset(group.posts.all())
+    page_obj = cached_feed_page(
+        request, post, group_scope(group.id),
+        count=lambda: cached_count(group.posts.all(), group_scope(group.id)),
+    )
     context = {
         'group': group,
-        'page_obj': imitation_of_page(request, post),
+        'page_obj': prefetch_thumbnails(page_obj),
+        'card_cache_timeout': CARD_CACHE_TIMEOUT,
     }
 
     return render(request, 'posts/group_list.html', context)
 
 
+@replica_reads
+@conditional_page(profile_scopes)
 def profile(request, username):
     """Профайл пользователя."""
-    author = get_object_or_404(User, username=username)
-    post = author.posts.all()
+    author = author_for(request, username)
+    author_stats = UserStats.for_user(author)
+    post = feed_queryset(author.posts.all())
+    page_obj = cached_feed_page(
+        request, post, author_scope(author.id),
+        count=author_stats.posts_count,
+    )
 
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=author).exists()
     context = {
         'author': author,
-        'page_obj': imitation_of_page(request, post),
+        'author_stats': author_stats,
+        'page_obj': prefetch_thumbnails(page_obj),
+        'card_cache_timeout': CARD_CACHE_TIMEOUT,
         'following': following,
+        'suggestions': recommendations.suggestions_for(request.user),
     }
 
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    """Полнотекстовый поиск по постам и комментариям."""
+    query = request.GET.get('q', '').strip()
+    page_number = parse_page_number(request.GET.get('page')) or 1
+    ids = search_post_ids(
+        query, VARIABLE_POSTS + 1, (page_number - 1) * VARIABLE_POSTS
+    )
+    has_next = len(ids) > VARIABLE_POSTS
+    ids = ids[:VARIABLE_POSTS]
+    posts = feed_queryset(Post.objects).in_bulk(ids)
+    page_obj = CursorPage([posts[pk] for pk in ids if pk in posts])
+    context = {
+        'query': query,
+        'page_obj': prefetch_thumbnails(attach_card_versions(page_obj)),
+        'card_cache_timeout': CARD_CACHE_TIMEOUT,
+        'page_number': page_number,
+        'has_next': has_next,
+    }
+
+    return render(request, 'posts/search.html', context)
+
+
+@replica_reads
+@conditional_page(post_detail_scopes)
 def post_detail(request, post_id):
     """Функция страницы поста."""
-    post = get_object_or_404(Post, pk=post_id)
+    post = post_for(request, post_id)
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comments_page(post.id)
     context = {
         'post': post,
+        'author_stats': UserStats.for_user(post.author_id),
         'form': form,
         'comments': comments,
     }
@@ -61,7 +143,33 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая порция комментариев поста: HTML-фрагмент или JSON."""
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    comments = comments_page(post.id, request.GET.get('cursor'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.id,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next': comments.next_cursor,
+        })
+
+    return render(request, 'posts/includes/comments_list.html', {
+        'post': post,
+        'comments': comments,
+    })
+
+
+@rate_limit('post', methods=('POST',))
 @login_required
+@transaction.atomic
 def post_create(request):
     """Функция страницы создания поста."""
     form = PostForm(
@@ -72,6 +180,8 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        timeline.fan_out_post(post)
+        schedule_processing(post)
 
         return redirect('posts:profile', username=post.author)
 
@@ -92,8 +202,9 @@ def post_edit(request, post_id):
     )
     if request.method == "POST" and form.is_valid():
         post = form.save(commit=False)
-        post.author = request.user
-        post.save()
+        post.save(update_fields=PostForm.Meta.fields)
+        if 'image' in form.changed_data:
+            schedule_processing(post)
 
         return redirect('posts:post_detail', post_id=post_id)
 
@@ -104,7 +215,9 @@ def post_edit(request, post_id):
     })
 
 
+@rate_limit('comment', methods=('POST',))
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     """Функция для создания комментария."""
     post = get_object_or_404(Post, id=post_id)
@@ -121,29 +234,40 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     """Главная функция подписок."""
-    post = Post.objects.filter(author__following__user=request.user)
+    page_obj = timeline.timeline_page(request, request.user)
     context = {
-        'page_obj': imitation_of_page(request, post),
+        'page_obj': prefetch_thumbnails(attach_card_versions(page_obj)),
+        'card_cache_timeout': CARD_CACHE_TIMEOUT,
+        'suggestions': recommendations.suggestions_for(request.user),
     }
     template = 'posts/follow.html'
 
     return render(request, template, context)
 
 
+@rate_limit('follow')
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     """Функция для подписки на автора"""
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        _, created = Follow.objects.get_or_create(
+            user=request.user, author=author
+        )
+        if created:
+            timeline.follow(request.user, author)
 
     return redirect('posts:profile', username=username)
 
 
+@rate_limit('follow')
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     """Функция для отписки от автора"""
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
+    timeline.unfollow(request.user, author)
 
     return redirect('posts:profile', username=username)
@@ -31,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,14 +45,26 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# В боевом режиме шаблоны компилируются один раз на процесс,
+# при отладке перечитываются с диска на каждую отрисовку.
+TEMPLATES_CACHED = not DEBUG
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if TEMPLATES_CACHED:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backend.TimedDjangoTemplates',
         'DIRS': [
             os.path.join(BASE_DIR, 'templates')
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -68,9 +82,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # Копия основной базы только для чтения. Обновляется командой
+    # sync_replicas, которую нужно запустить до первого запроса
+    # и дальше запускать периодически. Чтения идут в неё, только если
+    # задана переменная окружения YATUBE_DB_REPLICA (см. ниже).
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# Ленты, профили и страницы постов читают из реплик, если реплика
+# включена: YATUBE_DB_REPLICA=1. Клиент, который записал в базу,
+# REPLICA_PIN_SECONDS секунд читает из основной: значение должно быть
+# не меньше интервала запуска sync_replicas.
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+DATABASE_REPLICAS = ['replica'] if os.environ.get('YATUBE_DB_REPLICA') else []
+REPLICA_PIN_SECONDS = 60
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -111,12 +142,89 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки хранятся под хешем содержимого, одинаковые файлы — один раз.
+# Миниатюры sorl именуются от имени исходника, то есть от того же хеша,
+# и лежат в обычном хранилище под своими вычисленными именами.
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+# Общий для всех воркеров кеш в файле SQLite. Для одного процесса
+# можно вернуть 'django.core.cache.backends.locmem.LocMemCache'.
+# Тесты работают с копией настроек, где файл кеша временный.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 10,
+        },
     }
 }
 
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Шаблоны приложений ищет app_directories из TEMPLATE_LOADERS,
+# флаг APP_DIRS вместе с явными загрузчиками не допускается.
+SILENCED_SYSTEM_CHECKS = ['debug_toolbar.W006']
+
+# Фоновый пул потоков для нарезки миниатюр и обработки загрузок.
+BACKGROUND_WORKERS = 2
+BACKGROUND_TASKS_SYNC = False
+
+# Загруженные картинки перекодируются в фоне; исходники можно сохранить.
+IMAGE_KEEP_ORIGINALS = False
+
+THUMBNAIL_KVSTORE = 'posts.kvstore.BulkKVStore'
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+
+# Лимиты на запись: rate — скорость пополнения корзины токенов,
+# burst — её объём. Считаются отдельно по IP и по пользователю.
+RATE_LIMITS = {
+    'post': {'rate': '10/h', 'burst': 5},
+    'comment': {'rate': '6/m', 'burst': 10},
+    'follow': {'rate': '30/m', 'burst': 20},
+}
+RATE_LIMIT_KEY_TIMEOUT = 3600
+
+# Ранжировщик ленты «Популярное»: класс с методом score(features).
+FEED_RANKER = 'posts.ranking.DecayRanker'
+
+# Замеры запросов: медленные пишутся в отдельный лог с ротацией,
+# сводка по представлениям — команда request_metrics.
+SLOW_REQUEST_MS = 500
+SLOW_REQUEST_SAMPLE_RATE = 1
+SLOW_REQUEST_QUERIES = 50
+REQUEST_METRICS_FLUSH_INTERVAL = 10
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'slow_requests': {
+            'format': '%(asctime)s %(process)d %(message)s',
+        },
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'slow_requests.log'),
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'slow_requests',
+        },
+    },
+    'loggers': {
+        'yatube.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}